@@ -1,111 +1,34 @@
 import pandas as pd
-import numpy as np
 import os
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox, filedialog
 import threading  # เพิ่ม threading
+import sys
+
+# ใช้ batch feature engine ร่วมกับระบบ real-time (semester_2/main/combine_system)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'semester_2', 'main', 'combine_system'))
+from feature_batch import compute_features
 
 # ฟังก์ชันหลักที่ทำงานตามที่อธิบาย
 def calculate_rates(file_path, frame_rate_threshold, use_frame_rate, use_machine_frame_rate, progress_callback):
     # อ่านไฟล์ CSV
     data = pd.read_csv(file_path)
     
-    # กำหนดลิสต์เพื่อเก็บค่าผลลัพธ์
-    frame_rates = []
-    cog_angles = []
-    movement_rates = []
-
-    # กำหนดจุดที่เชื่อมต่อสำหรับ Movement Rate
-    connections = [(0, 11), (11, 12), (12, 24), (24, 23), (23, 11), 
-                   (15, 13), (13, 11), (12, 14), (14, 16), 
-                   (23, 25), (25, 27), (24, 26), (26, 28)]
-
-    # คำนวณค่าตามจำนวนเฟรมที่มี n เป็นเฟรมก่อนหน้า n + 1 เฟรมปัจจุบัน
-    for n in range(len(data) - 1):  # เฟรมเริ่มจาก 0 ถึง len(data) - 2
-        # คำนวณ Frame Rate
-        if use_machine_frame_rate: 
-            frame_rate = 1  # กำหนด Frame Rate เป็น 1 เมื่อใช้ machine frame rate
-        else:
-            image_timestamp_n = data['Image_Timestamp'][n]
-            pose_timestamp_n = data['Pose_Timestamp'][n]
-            if n + 1 < len(data):
-                image_timestamp_n1 = data['Image_Timestamp'][n + 1]  # เฟรมปัจจุบัน
-                pose_timestamp_n1 = data['Pose_Timestamp'][n + 1]  # เฟรมปัจจุบัน
-                
-                frame_diff_n = abs(image_timestamp_n - pose_timestamp_n)
-                frame_diff_n1 = abs(image_timestamp_n1 - pose_timestamp_n1)  # เฟรมปัจจุบัน
-                frame_rate = abs(frame_diff_n - frame_diff_n1)
-            else:
-                frame_rate = 0  # กำหนดค่าเป็น 0 สำหรับเฟรมสุดท้ายที่ไม่มีการคำนวณ
-
-        # ตรวจสอบ frame_rate น้อยกว่า threshold
-        if use_frame_rate and frame_rate < frame_rate_threshold:
-            frame_rates.append(0)  # บันทึก 0 แทนเฟรมที่ข้าม
-            cog_angles.append(0)  # บันทึก 0 สำหรับมุม COG
-            movement_rates.append(0)  # บันทึก 0 สำหรับ Movement Rate
-            continue  
-
-        frame_rates.append(frame_rate)
-
-        frame_no = n + 1 # เฟรมปัจจุบัน
-
-        frame_data_left_x = data['x23'][frame_no]
-        frame_data_left_y = data['y23'][frame_no]
-
-        frame_data_right_x = data['x24'][frame_no]
-        frame_data_right_y = data['y24'][frame_no]
-
-        frame_data_nose_x = data['x0'][frame_no]
-        frame_data_nose_y = data['y0'][frame_no]
-        
-        # คำนวณ Center of Gravity Angle
-        cog_x_n1 = (frame_data_right_x + frame_data_left_x) / 2
-        cog_y_n1 = (frame_data_right_y + frame_data_left_y) / 2
-        
-        # Slope 
-        dx_n1 = cog_x_n1 - frame_data_nose_x  # x ของตำแหน่งอ้างอิงที่เฟรม ปัจจุบัน
-        dy_n1 = cog_y_n1 - frame_data_nose_y  # y ของตำแหน่งอ้างอิงที่เฟรม ปัจจุบัน
-
-        # คำนวณมุม COG ในเฟรม ปัจจุบัน
-        angle_n1 = np.arctan2(abs(dy_n1), abs(dx_n1)) * (180 / np.pi)
-        # angle_n1 = np.arctan2(dy_n1, dx_n1) * ( 180 / np.pi )
-
-
-        cog_angles.append(angle_n1)
-        
-        # คำนวณ Movement Rate
-        total_length_n = 0
-        total_length_n1 = 0
-        
-        for connection in connections:
-            point_a_n = data[f'x{connection[0]}'][n]
-            point_b_n = data[f'x{connection[1]}'][n]
-            # point_a_n = data.iloc[n, connection[0]]
-            # point_b_n = data.iloc[n, connection[1]]
-            total_length_n += np.sqrt(((point_a_n - point_b_n) ** 2) + ((data[f'y{connection[0]}'][n] - (data[f'y{connection[1]}'][n])) ** 2))
-            
-            # if n + 1 < len(data):
-                # point_a_n1 = 
-                # point_b_n1 = data[f'y{connection[0]}'][n + 1]
-                # point_a_n1 = data.iloc[n + 1, connection[0]]
-                # point_b_n1 = data.iloc[n + 1, connection[1]]
-                # total_length_n1 += np.sqrt((point_a_n1 - point_b_n1) ** 2 + (data.iloc[n + 1, connection[0] + 1] - data.iloc[n + 1, connection[1] + 1]) ** 2)
-            # else:
-            #     total_length_n1 += 0  # กำหนดเป็น 0 ถ้าไม่มีเฟรมถัดไป
-
-        movement_rate_n = np.sqrt((((total_length_n - total_length_n1) ** 2) / 1920) + (((total_length_n - total_length_n1) ** 2) / 1080)) / frame_rate
-
-        movement_rates.append(movement_rate_n)
-
-        # อัพเดต progress bar
-        progress_callback(n + 1, len(data) - 1)
+    # คำนวณทุกเฟรมพร้อมกันด้วยสูตรเดียวกับ FeatureCalculator ของระบบจริง
+    # threshold มีหน่วยเป็น fps จึงใช้ไม่ได้กับ frame rate จากเครื่อง (คงที่ 1)
+    features = compute_features(
+        data,
+        frame_rate_threshold=frame_rate_threshold if use_frame_rate and not use_machine_frame_rate else None,
+        use_machine_frame_rate=use_machine_frame_rate
+    )
+    progress_callback(len(features), len(features))
 
     # สร้าง DataFrame สำหรับผลลัพธ์
     result_df = pd.DataFrame({
-        'Frame_Rate': frame_rates,
-        'CoG_Angles': cog_angles,
-        'Movement_Rate': movement_rates
+        'Frame_Rate': features['Frame_Rate'],
+        'CoG_Angles': features['CoG_Angle'],
+        'Movement_Rate': features['Movement_Rate']
     })
 
     # สร้าง path สำหรับบันทึกผลลัพธ์
@@ -161,10 +84,11 @@ def open_gui():
     frame.place(relx=0.5, rely=0.5, anchor='center')
 
     # กรอกค่า Frame Rate Threshold
-    label = ttk.Label(frame, text="Set Frame Rate Threshold")
+    label = ttk.Label(frame, text="Set Frame Rate Threshold (fps)")
     label.grid(row=0, column=0, pady=10)
 
-    frame_rate_threshold_var = tk.DoubleVar(value=0.0039)
+    # เฟรมที่ห่างจากเฟรมก่อนหน้าเกิน 0.2 วินาที (ต่ำกว่า 5 fps) จะถูกเขียนเป็น 0
+    frame_rate_threshold_var = tk.DoubleVar(value=5.0)
     entry = ttk.Entry(frame, textvariable=frame_rate_threshold_var)
     entry.grid(row=1, column=0, pady=10)
 
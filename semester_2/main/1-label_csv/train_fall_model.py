@@ -0,0 +1,83 @@
+"""Fit the fall classifier once and export it for label.py.
+
+Same Label Propagation setup as label-2.py (labeled CSV + unlabeled CSV,
+Movement_Rate outliers above 1000 removed), but instead of plotting, the
+fitted model is written as a fall_model.py artifact.
+
+    python train_fall_model.py
+    python train_fall_model.py --labeled combined_filtered_data_with_new_labels.csv \
+        --unlabeled fall.csv --out ../combine_system/fall_model.bin
+
+With --table the model is also compiled into a uint8 lookup table
+(fall_model.FallTable) and its agreement with the exact model is printed
+for the rows held out by --holdout (or for all rows when it is 0):
+
+    python train_fall_model.py --holdout 0.2 --table ../combine_system/fall_table.bin
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.semi_supervised import LabelPropagation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'combine_system'))
+import fall_model  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and export the fall classifier")
+    parser.add_argument("--labeled", default="combined_filtered_data_with_new_labels.csv")
+    parser.add_argument("--unlabeled", default="fall.csv")
+    parser.add_argument("--out", default=os.path.join("..", "combine_system", "fall_model.bin"))
+    parser.add_argument("--neighbors", type=int, default=9)
+    parser.add_argument("--max-movement-rate", type=float, default=1000)
+    parser.add_argument("--table", default=None, help="also write a lookup table to this file")
+    parser.add_argument("--table-bins", type=int, nargs=3, default=list(fall_model.TABLE_BINS),
+                        metavar=("FRAME_RATE", "COG_ANGLE", "MOVEMENT_RATE"))
+    parser.add_argument("--holdout", type=float, default=0.0,
+                        help="fraction of labeled rows kept out of training for the agreement check")
+    args = parser.parse_args()
+
+    features = list(fall_model.FEATURES)
+
+    # 1. อ่านข้อมูลที่มี Label และที่ยังไม่มี Label (ตัด outlier เหมือน label-2.py)
+    labeled_data = pd.read_csv(args.labeled)
+    labeled_data = labeled_data[labeled_data['Movement_Rate'] <= args.max_movement_rate]
+    holdout_data = labeled_data.sample(frac=args.holdout, random_state=0)
+    labeled_data = labeled_data.drop(holdout_data.index)
+    X_labeled = labeled_data[features].values
+    y_labeled = labeled_data['Label'].values
+
+    X_parts, y_parts = [X_labeled], [y_labeled]
+    if args.unlabeled and os.path.isfile(args.unlabeled):
+        unlabeled_data = pd.read_csv(args.unlabeled)
+        unlabeled_data = unlabeled_data[unlabeled_data['Movement_Rate'] <= args.max_movement_rate]
+        X_parts.append(unlabeled_data[features].values)
+        y_parts.append(np.full(len(unlabeled_data), -1))
+
+    # 2. ฝึกโมเดล Label Propagation
+    model = LabelPropagation(kernel='knn', n_neighbors=args.neighbors, max_iter=100, tol=1e-3)
+    model.fit(np.vstack(X_parts), np.concatenate(y_parts))
+
+    # 3. บันทึกโมเดลเป็นไฟล์สำหรับ label.py
+    fall_model.save(args.out, model.X_, model.label_distributions_, model.classes_, args.neighbors)
+
+    # ตรวจสอบว่าไฟล์ที่บันทึกให้ผลเหมือนโมเดลเดิม
+    exported = fall_model.FallModel.load(args.out)
+    agreement = np.mean(exported.predict(X_labeled) == model.predict(X_labeled))
+    print(f"Saved {len(model.X_)} points, classes {list(model.classes_)} to {args.out} "
+          f"(agreement with scikit-learn: {agreement:.2%})")
+
+    # 4. สร้างตารางค้นหา (lookup table) และเทียบกับโมเดลจริง
+    if args.table:
+        low, high = fall_model.table_ranges(model.X_)
+        labels = fall_model.build_table(exported, low, high, bins=args.table_bins)
+        fall_model.save_table(args.table, labels, low, high)
+
+        table = fall_model.FallTable.load(args.table)
+        X_check = holdout_data[features].values if len(holdout_data) else np.vstack(X_parts)
+        agreement = np.mean(table.predict(X_check) == exported.predict(X_check))
+        print(f"Saved {labels.size} cell table ({labels.nbytes / 1024:.0f} KiB) to {args.table} "
+              f"(agreement with the exact model on {len(X_check)} "
+              f"{'held-out' if len(holdout_data) else 'training'} rows: {agreement:.2%})")
@@ -0,0 +1,159 @@
+import json
+import time
+from collections import deque
+from threading import Thread, Event, Condition
+
+import cv2
+import zmq
+
+from config import FRAME_RING, TOPICS, TOPOLOGY
+from frame_codec import send_frame, send_frame_slot
+from frame_ring import FrameRing
+from timestamps import now_ns
+
+
+class RateCounter:
+    """Counts events and reports their rate about once per `interval` seconds"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.start_time = time.time()
+        self.count = 0
+        self.rate = 0.0
+
+    def tick(self):
+        """Count one event. Returns the new rate when a window closes, else None"""
+        self.count += 1
+        elapsed_time = time.time() - self.start_time
+        if elapsed_time >= self.interval:
+            self.rate = self.count / elapsed_time
+            self.start_time = time.time()
+            self.count = 0
+            return self.rate
+        return None
+
+
+class FrameGrabber:
+    """Reads a cv2.VideoCapture on its own thread.
+
+    Only the most recent `max_frames` frames are kept; when the consumer falls
+    behind the oldest frame is dropped, so a slow encode or UI redraw never
+    delays cap.read() and stale frames never reach the pipeline.
+    """
+
+    def __init__(self, cap, max_frames=2, loop=False, frame_delay=0.0):
+        self.cap = cap
+        self.loop = loop                # rewind at end of stream (video files)
+        self.frame_delay = frame_delay  # pace file sources; live sources pace themselves
+        self.frames = deque(maxlen=max_frames)
+        self.condition = Condition()
+        self.stop_event = Event()
+        self.thread = None
+        self.finished = False
+        self.dropped = 0
+        self.rate = RateCounter()
+
+    @property
+    def fps(self):
+        return self.rate.rate
+
+    def start(self):
+        self.stop_event.clear()
+        self.finished = False
+        self.thread = Thread(target=self.grab_frames, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def grab_frames(self):
+        while not self.stop_event.is_set():
+            start_time = time.time()
+
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.loop:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                break
+            timestamps = now_ns()
+
+            with self.condition:
+                if len(self.frames) == self.frames.maxlen:
+                    self.dropped += 1
+                self.frames.append((frame, timestamps))
+                self.condition.notify()
+            self.rate.tick()
+
+            elapsed_time = time.time() - start_time
+            if elapsed_time < self.frame_delay:
+                time.sleep(self.frame_delay - elapsed_time)
+
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """Oldest buffered (frame, (timestamp_ns, monotonic_ns)), or None on timeout / end of stream"""
+        with self.condition:
+            if not self.frames and not self.finished:
+                self.condition.wait(timeout)
+            if self.frames:
+                return self.frames.popleft()
+            return None
+
+
+class FramePublisher:
+    """Publishes frames on the Sender_frame topic and capture statistics on FPS"""
+
+    def __init__(self, context):
+        self.socket = context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.socket, 'frames')
+        self.socket.bind(TOPOLOGY.bind_address('frames'))
+
+        self.fps_socket = context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.fps_socket, 'fps')
+        self.fps_socket.bind(TOPOLOGY.bind_address('fps'))
+
+        self.seq = 0
+        self.use_shm = False
+        self.frame_ring = None
+
+    def enable_shm(self):
+        """Send frames through shared memory from now on.
+
+        The ring lives until close() so attached consumers keep a valid mapping.
+        """
+        if self.frame_ring is None:
+            self.frame_ring = FrameRing.create(**FRAME_RING)
+        self.use_shm = True
+
+    def publish(self, frame, timestamps):
+        # A slot notification when the frame is in shared memory, otherwise
+        # JPEG bytes with a binary header
+        if self.use_shm and self.frame_ring.fits(frame):
+            send_frame_slot(self.socket, self.frame_ring, frame, self.seq, timestamps)
+        else:
+            send_frame(self.socket, frame, self.seq, timestamps)
+        self.seq += 1
+
+    def publish_fps(self, timestamps, fps, grabber):
+        fps_data = {
+            "timestamp_ns": timestamps[0],
+            "monotonic_ns": timestamps[1],
+            "fps": fps,
+            "capture_fps": grabber.fps,
+            "dropped": grabber.dropped
+        }
+        self.fps_socket.send_string(TOPICS['fps'], zmq.SNDMORE)
+        self.fps_socket.send_string(json.dumps(fps_data))
+
+    def close(self):
+        self.socket.close()
+        self.fps_socket.close()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
@@ -10,6 +10,8 @@ import os
 import base64
 import cv2
 import glob
+from config import TOPICS, TOPOLOGY
+from timestamps import format_timestamp
 
 class EnhancedFeatureVisualizer:
     def __init__(self, max_points=5000):
@@ -17,8 +19,9 @@ class EnhancedFeatureVisualizer:
         
         # ตั้งค่าการเชื่อมต่อ ZMQ
         self.feature_socket = self.context.socket(zmq.SUB)
-        self.feature_socket.connect("tcp://localhost:5559")
-        self.feature_socket.setsockopt_string(zmq.SUBSCRIBE, "FeatureData")
+        TOPOLOGY.configure_socket(self.feature_socket, 'feature_data')
+        self.feature_socket.connect(TOPOLOGY.connect_address('feature_data'))
+        self.feature_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['feature_data'])
         self.feature_socket.setsockopt(zmq.RCVHWM, 100)  # High water mark
         self.feature_socket.setsockopt(zmq.RCVTIMEO, 100)
         
@@ -87,7 +90,8 @@ class EnhancedFeatureVisualizer:
                     # บันทึกข้อมูล
                     self.cog_angles.append(feature_data["CoG_Angle"])
                     self.movement_rates.append(feature_data["Movement_Rate"])
-                    self.timestamps.append(feature_data["Feature_Timestamp"])
+                    timestamp = format_timestamp(feature_data["Feature_Timestamp_ns"])
+                    self.timestamps.append(timestamp)
                     
                     # บันทึกข้อมูลเฟรมถ้ามี
                     if "FrameData" in feature_data:
@@ -99,7 +103,7 @@ class EnhancedFeatureVisualizer:
                     self.latest_values = {
                         "CoG_Angle": feature_data["CoG_Angle"],
                         "Movement_Rate": feature_data["Movement_Rate"],
-                        "Timestamp": feature_data["Feature_Timestamp"]
+                        "Timestamp": timestamp
                     }
                     
                 except zmq.Again:
@@ -1,9 +1,17 @@
 # config.py
-PORTS = {
-    'pose_data': 5556,
-    'feature_data': 5559,
-    'fall_alerts': 5560,
-    'annotated_images': 5561,
-    'zone_data': 5557,
-    'graph_data': 5558
-}
\ No newline at end of file
+# Ports and topics come from topology.json (see topology.py). Set FALL_CAMERA
+# to run another copy of the pipeline on the ports of that camera.
+from topology import load_topology
+
+TOPOLOGY = load_topology()
+PORTS = TOPOLOGY.ports()
+TOPICS = TOPOLOGY.topics()
+
+# Shared-memory frame transport (frame_ring.py), used when input.py runs
+# with "Shared Memory" enabled. Consumers read the geometry from the segment.
+FRAME_RING = {
+    'name': 'fall_detection_frames' + (f'_{TOPOLOGY.camera}' if TOPOLOGY.camera else ''),
+    'slots': 8,
+    'max_height': 1080,
+    'max_width': 1920
+}
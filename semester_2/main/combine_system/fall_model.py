@@ -0,0 +1,208 @@
+"""Fall classifier artifact: a fitted kNN LabelPropagation in a compact binary file.
+
+LabelPropagation(kernel='knn') predicts by adding up the label
+distributions of the k nearest training points and taking the largest, so
+the fitted model is fully described by:
+
+- the training points X_ (n, 3) as float32
+- their label_distributions_ (n, classes) as float32
+- classes_ as int32 and n_neighbors
+
+File layout (little-endian), written by save() and read by FallModel.load():
+
+    header | points | distributions | classes
+
+Loading is one read and three np.frombuffer views, so label.py starts
+without scikit-learn and without refitting. The training side lives in
+semester_2/main/1-label_csv/train_fall_model.py.
+
+Neighbours are found with a KD-tree (scipy's cKDTree, built once at load)
+and queries are meant to be batched: one predict() call for many feature
+rows costs little more than for one. Without scipy a vectorized brute-force
+search gives the same result.
+
+For the cheapest runtime the model can also be compiled into a FallTable:
+the class of every cell of a (Frame_Rate, CoG_Angle, Movement_Rate) grid,
+one uint8 each, with Movement_Rate on a log1p axis. Classifying is then a
+memory-mapped array index. load_classifier() opens either kind of file.
+
+    header | labels (bins[0], bins[1], bins[2]) uint8
+"""
+import struct
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy comes with scikit-learn on the training side, but is optional here
+    cKDTree = None
+
+MODEL_MAGIC = b"FDKN"
+MODEL_VERSION = 1
+FEATURES = ('Frame_Rate', 'CoG_Angle', 'Movement_Rate')
+
+# magic, version, n_features, n_samples, n_classes, n_neighbors
+MODEL_HEADER = struct.Struct("<4sHHIII")
+
+TABLE_MAGIC = b"FDLT"
+TABLE_VERSION = 1
+# magic, version, bins per feature (3), log-axis bitmask, low (3) and high (3) edge per feature
+TABLE_HEADER = struct.Struct("<4sHHHHH3f3f")
+TABLE_BINS = (64, 91, 128)
+LOG_AXES = (2,)  # Movement_Rate spans several orders of magnitude
+
+
+def save(path, points, distributions, classes, n_neighbors):
+    """Write a fitted model (e.g. LabelPropagation's X_, label_distributions_, classes_)"""
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    distributions = np.ascontiguousarray(distributions, dtype=np.float32)
+    classes = np.ascontiguousarray(classes, dtype=np.int32)
+    if points.shape != (len(distributions), len(FEATURES)) or distributions.shape[1] != len(classes):
+        raise ValueError("points, distributions and classes do not match")
+
+    with open(path, 'wb') as f:
+        f.write(MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, len(FEATURES),
+                                  len(points), len(classes), n_neighbors))
+        f.write(points.tobytes())
+        f.write(distributions.tobytes())
+        f.write(classes.tobytes())
+
+
+class FallModel:
+    def __init__(self, points, distributions, classes, n_neighbors):
+        self.points = points
+        self.distributions = distributions
+        self.classes = classes
+        self.n_neighbors = min(n_neighbors, len(points))
+        self.tree = cKDTree(points) if cKDTree is not None else None
+
+    @classmethod
+    def load(cls, path):
+        """Read a model written by save(), raising ValueError on foreign or newer files"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < MODEL_HEADER.size:
+            raise ValueError(f"{path} is too short for a fall model")
+        magic, version, n_features, n_samples, n_classes, n_neighbors = MODEL_HEADER.unpack_from(data)
+        if magic != MODEL_MAGIC:
+            raise ValueError(f"{path} is not a fall model")
+        if version != MODEL_VERSION:
+            raise ValueError(f"Unsupported fall model version {version}")
+        if n_features != len(FEATURES):
+            raise ValueError(f"Fall model has {n_features} features, expected {len(FEATURES)}")
+
+        offset = MODEL_HEADER.size
+        points = np.frombuffer(data, np.float32, n_samples * n_features, offset).reshape(n_samples, n_features)
+        offset += points.nbytes
+        distributions = np.frombuffer(data, np.float32, n_samples * n_classes, offset).reshape(n_samples, n_classes)
+        offset += distributions.nbytes
+        classes = np.frombuffer(data, np.int32, n_classes, offset)
+        return cls(points, distributions, classes, n_neighbors)
+
+    def neighbors(self, features):
+        """Indices (m, k) of the k nearest training points of every row in features (m, 3)"""
+        if self.tree is not None:
+            _, indices = self.tree.query(features, k=self.n_neighbors)
+            return np.asarray(indices).reshape(len(features), self.n_neighbors)
+        diff = features[:, None, :] - self.points[None, :, :]
+        distances = np.einsum('mnd,mnd->mn', diff, diff)
+        return np.argpartition(distances, self.n_neighbors - 1, axis=1)[:, :self.n_neighbors]
+
+    def predict_proba(self, features):
+        features = np.asarray(features, dtype=np.float32).reshape(-1, self.points.shape[1])
+        scores = self.distributions[self.neighbors(features)].sum(axis=1)
+        total = scores.sum(axis=1, keepdims=True)
+        return np.divide(scores, total, out=np.zeros_like(scores), where=total > 0)
+
+    def predict(self, features):
+        """Class of every row in features (m, 3), as LabelPropagation.predict would give"""
+        return self.classes[np.argmax(self.predict_proba(features), axis=1)]
+
+
+def table_ranges(points, log_axes=LOG_AXES):
+    """(low, high) grid edges per feature, in table space, covering the training points"""
+    points = transform(np.asarray(points, dtype=np.float32), log_axes)
+    low, high = points.min(axis=0), points.max(axis=0)
+    # CoG_Angle is bounded to 0-90 degrees
+    angle = FEATURES.index('CoG_Angle')
+    low[angle], high[angle] = 0.0, 90.0
+    return low, np.maximum(high, low + 1e-3)
+
+
+def transform(features, log_axes):
+    """Features in table space: log1p on log_axes, negative values clipped there"""
+    features = np.array(features, dtype=np.float32).reshape(-1, len(FEATURES))
+    for axis in log_axes:
+        features[:, axis] = np.log1p(np.maximum(features[:, axis], 0))
+    return features
+
+
+def build_table(model, low, high, bins=TABLE_BINS, log_axes=LOG_AXES, chunk=65536):
+    """Class of model at the centre of every grid cell, as a uint8 (bins) array"""
+    bins = tuple(int(b) for b in bins)
+    if model.classes.min() < 0 or model.classes.max() > 255:
+        raise ValueError("Fall table classes must fit in uint8")
+    low, high = np.asarray(low, np.float32), np.asarray(high, np.float32)
+    centres = [low[axis] + (np.arange(n) + 0.5) * (high[axis] - low[axis]) / n
+               for axis, n in enumerate(bins)]
+    grid = np.stack(np.meshgrid(*centres, indexing='ij'), axis=-1).reshape(-1, len(FEATURES))
+    for axis in log_axes:
+        grid[:, axis] = np.expm1(grid[:, axis])
+
+    labels = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), chunk):
+        labels[start:start + chunk] = model.predict(grid[start:start + chunk])
+    return labels.reshape(bins)
+
+
+def save_table(path, labels, low, high, log_axes=LOG_AXES):
+    """Write a table from build_table() with the ranges it was built for"""
+    labels = np.ascontiguousarray(labels, dtype=np.uint8)
+    log_mask = sum(1 << axis for axis in log_axes)
+    with open(path, 'wb') as f:
+        f.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, *labels.shape, log_mask, *low, *high))
+        f.write(labels.tobytes())
+
+
+class FallTable:
+    """Grid-quantized FallModel: predict() is one table lookup per row"""
+
+    def __init__(self, labels, low, high, log_axes):
+        self.labels = labels
+        self.bins = np.array(labels.shape)
+        self.low = np.asarray(low, np.float32)
+        self.scale = self.bins / (np.asarray(high, np.float32) - self.low)
+        self.log_axes = log_axes
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a table written by save_table(), raising ValueError on foreign or newer files"""
+        with open(path, 'rb') as f:
+            header = f.read(TABLE_HEADER.size)
+        if len(header) < TABLE_HEADER.size:
+            raise ValueError(f"{path} is too short for a fall table")
+        magic, version, *fields = TABLE_HEADER.unpack(header)
+        if magic != TABLE_MAGIC:
+            raise ValueError(f"{path} is not a fall table")
+        if version != TABLE_VERSION:
+            raise ValueError(f"Unsupported fall table version {version}")
+
+        bins, log_mask, low, high = tuple(fields[:3]), fields[3], fields[4:7], fields[7:10]
+        labels = np.memmap(path, np.uint8, 'r', offset=TABLE_HEADER.size, shape=bins)
+        log_axes = tuple(axis for axis in range(len(FEATURES)) if log_mask & (1 << axis))
+        return cls(labels, low, high, log_axes)
+
+    def predict(self, features):
+        """Class of every row in features (m, 3); values outside the grid use the edge cell"""
+        index = ((transform(features, self.log_axes) - self.low) * self.scale).astype(np.intp)
+        np.clip(index, 0, self.bins - 1, out=index)
+        return self.labels[index[:, 0], index[:, 1], index[:, 2]]
+
+
+def load_classifier(path):
+    """FallModel or FallTable, whichever kind of file path is"""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic == TABLE_MAGIC:
+        return FallTable.load(path)
+    return FallModel.load(path)
@@ -0,0 +1,71 @@
+"""Turn per-frame fall predictions into stable fall states.
+
+The classifier gives a 0/1/2 state for every FeatureData message, and these
+flicker from frame to frame. FallStateMachine smooths them for one track:
+
+- the state it reports is the majority of the last `window` predictions
+  (ties go to the more severe state)
+- "Fallen" (2) needs at least `fallen_run` consecutive 2 predictions
+- after a change, the state is held for at least `debounce` seconds
+- update() returns a state only on a change or every `heartbeat` seconds,
+  so FallAlert subscribers are only woken up when there is news
+
+configure() changes the thresholds of a running machine (label.py does this
+when a person enters a zone with its own sensitivity) and keeps its state.
+"""
+from collections import deque
+
+import numpy as np
+
+FALLEN = 2
+N_STATES = 3
+
+
+class FallStateMachine:
+    def __init__(self, window=15, fallen_run=5, debounce=1.0, heartbeat=5.0):
+        self.predictions = deque(maxlen=window)
+        self.configure(window, fallen_run, debounce, heartbeat)
+        self.state = 0
+        self.run = 0              # consecutive FALLEN predictions
+        self.changed_ns = None    # when state last changed
+        self.published_ns = None  # when state was last returned
+
+    def configure(self, window=15, fallen_run=5, debounce=1.0, heartbeat=5.0):
+        if window != self.predictions.maxlen:
+            self.predictions = deque(self.predictions, maxlen=window)
+        self.fallen_run = fallen_run
+        self.debounce_ns = int(debounce * 1e9)
+        self.heartbeat_ns = int(heartbeat * 1e9)
+
+    def vote(self):
+        """Majority of the window; Fallen only after a long enough run"""
+        counts = np.bincount(self.predictions, minlength=N_STATES)
+        candidate = int(np.flatnonzero(counts == counts.max())[-1])
+        if candidate == FALLEN and self.run < self.fallen_run:
+            return self.state
+        if self.run >= self.fallen_run:
+            return FALLEN
+        return candidate
+
+    def update(self, prediction, monotonic_ns):
+        """(state, reason) to publish for this prediction, or None.
+
+        reason is "transition" when the state changed and "heartbeat" when it
+        is only repeated because `heartbeat` seconds passed.
+        """
+        prediction = min(max(int(prediction), 0), N_STATES - 1)
+        self.predictions.append(prediction)
+        self.run = self.run + 1 if prediction == FALLEN else 0
+
+        if self.changed_ns is None:
+            self.changed_ns = monotonic_ns
+        candidate = self.vote()
+        if candidate != self.state and monotonic_ns - self.changed_ns >= self.debounce_ns:
+            self.state = candidate
+            self.changed_ns = self.published_ns = monotonic_ns
+            return self.state, "transition"
+
+        if self.published_ns is None or monotonic_ns - self.published_ns >= self.heartbeat_ns:
+            self.published_ns = monotonic_ns
+            return self.state, "heartbeat"
+        return None
@@ -1,32 +1,52 @@
+import argparse
+import base64
+import io
 import zmq
 import json
-import numpy as np
-from datetime import datetime
 import time
-import csv
-import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from threading import Thread, Event
+from collections import deque
+from threading import Thread, Event, Lock
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MaxNLocator
+from config import TOPICS, TOPOLOGY
+from feature_service import TrackedFeatureCalculator, CSVWriter
+from timestamps import elapsed_seconds, format_timestamp, now_ns
 
 class FeatureCalculatorApp:
-    def __init__(self, root):
+    """Tk front end for FeatureCalculator.
+
+    Features are computed and published on a worker thread. The text view and
+    plots are refreshed from the Tk loop at `plot_hz`, and the GraphImage
+    snapshot is rendered only while someone subscribes to it, at most once
+    every `graph_interval` seconds.
+    """
+
+    def __init__(self, root, plot_hz=5.0, graph_interval=1.0):
         self.root = root
+        self.plot_interval_ms = max(1, int(1000 / plot_hz))
+        self.graph_interval = graph_interval
         self.running = False
         self.stop_event = Event()
         self.use_real_scale = False
         self.save_csv = False
         self.csv_writer = None
         self.calculator = None
-        self.feature_history = []
         self.max_history = 100  # Max data points to keep for plotting
+        self.feature_history = deque(maxlen=self.max_history)
+        self.history_lock = Lock()
+        self.pending_display = deque()  # features not yet shown in the text view
+        self.plots_dirty = False
+        self.background = None          # figure pixels without the lines, for blitting
+        self.graph_subscribed = False
+        self.last_graph_ns = None
         
         self.setup_ui()
         self.setup_zmq()
+        self.refresh_job = self.root.after(self.plot_interval_ms, self.refresh)
         
     def setup_ui(self):
         self.root.title("Feature Calculator")
@@ -115,10 +135,13 @@ class FeatureCalculatorApp:
         
         self.figure.tight_layout(pad=3.0)
         
-        # Initialize empty plots
-        self.line1, = self.ax1.plot([], [], 'b-')
-        self.line2, = self.ax2.plot([], [], 'r-')
-        self.line3, = self.ax3.plot([], [], 'g-')
+        # Initialize empty plots. The lines are animated: a full draw renders
+        # only axes and labels, and the lines are blitted on top of that
+        self.line1, = self.ax1.plot([], [], 'b-', animated=True)
+        self.line2, = self.ax2.plot([], [], 'r-', animated=True)
+        self.line3, = self.ax3.plot([], [], 'g-', animated=True)
+        self.lines = [self.line1, self.line2, self.line3]
+        self.axes = [self.ax1, self.ax2, self.ax3]
         
         # Set titles and labels
         self.ax1.set_title('Frame Rate (fps)')
@@ -131,22 +154,28 @@ class FeatureCalculatorApp:
             ax.grid(True)
             ax.xaxis.set_major_locator(MaxNLocator(5))
         
+        # Every full draw (first show, resize, rescale) refreshes the background
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        
     def setup_zmq(self):
         self.context = zmq.Context()
         
         # Socket for receiving Pose data
         self.pose_socket = self.context.socket(zmq.SUB)
-        self.pose_socket.connect("tcp://localhost:5556")
-        self.pose_socket.setsockopt_string(zmq.SUBSCRIBE, "PoseData")
+        TOPOLOGY.configure_socket(self.pose_socket, 'pose_data')
+        self.pose_socket.connect(TOPOLOGY.connect_address('pose_data'))
+        self.pose_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['pose_data'])
         self.pose_socket.setsockopt(zmq.RCVTIMEO, 100)  # 100ms timeout
         
         # Socket for sending Feature data
         self.feature_socket = self.context.socket(zmq.PUB)
-        self.feature_socket.bind("tcp://*:5559")
+        TOPOLOGY.configure_socket(self.feature_socket, 'feature_data')
+        self.feature_socket.bind(TOPOLOGY.bind_address('feature_data'))
         
-        # เพิ่ม socket สำหรับส่งกราฟ
-        self.graph_socket = self.context.socket(zmq.PUB)
-        self.graph_socket.bind("tcp://*:5560")
+        # เพิ่ม socket สำหรับส่งกราฟ (XPUB เพื่อให้รู้ว่ามีผู้รับอยู่หรือไม่)
+        self.graph_socket = self.context.socket(zmq.XPUB)
+        TOPOLOGY.configure_socket(self.graph_socket, 'graph_data')
+        self.graph_socket.bind(TOPOLOGY.bind_address('graph_data'))
         
     def browse_csv(self):
         filename = filedialog.asksaveasfilename(
@@ -175,7 +204,7 @@ class FeatureCalculatorApp:
                     return
                 self.csv_writer = CSVWriter(csv_filename)
             
-            self.calculator = FeatureCalculator(use_real_scale=self.use_real_scale)
+            self.calculator = TrackedFeatureCalculator(use_real_scale=self.use_real_scale)
             self.running = True
             self.stop_event.clear()
             self.start_btn.config(state=tk.DISABLED)
@@ -197,7 +226,9 @@ class FeatureCalculatorApp:
                 self.csv_writer = None
                 
     def clear_data(self):
-        self.feature_history = []
+        with self.history_lock:
+            self.feature_history.clear()
+        self.pending_display.clear()
         self.update_plots()
         self.text_display.delete(1.0, tk.END)
         self.status_var.set("Data cleared")
@@ -213,23 +244,18 @@ class FeatureCalculatorApp:
                 
                 if features:
                     # Send features via ZeroMQ
-                    self.feature_socket.send_string("FeatureData", zmq.SNDMORE)
+                    self.feature_socket.send_string(TOPICS['feature_data'], zmq.SNDMORE)
                     self.feature_socket.send_string(json.dumps(features))
                     
                     # Save to CSV if enabled
                     if self.save_csv and self.csv_writer:
                         self.csv_writer.write(features)
                     
-                    # Update display
-                    self.update_display(features)
-                    
-                    # Store for plotting
-                    self.feature_history.append(features)
-                    if len(self.feature_history) > self.max_history:
-                        self.feature_history.pop(0)
-                    
-                    # Update plots
-                    self.update_plots()
+                    # Hand over to the Tk loop; display and plots refresh in refresh()
+                    self.pending_display.append(features)
+                    with self.history_lock:
+                        self.feature_history.append(features)
+                    self.plots_dirty = True
                     
             except zmq.Again:
                 continue
@@ -237,49 +263,124 @@ class FeatureCalculatorApp:
                 self.status_var.set(f"Error: {str(e)}")
                 time.sleep(1)
                 
-    def update_display(self, features):
-        display_text = (
-            f"⏱️ Timestamp: {features['Feature_Timestamp']}\n"
+    def refresh(self):
+        """Runs on the Tk loop every plot interval"""
+        pending = []
+        while self.pending_display:
+            pending.append(self.pending_display.popleft())
+        if pending:
+            self.update_display(pending)
+        
+        if self.plots_dirty:
+            self.plots_dirty = False
+            self.update_plots()
+        
+        self.update_graph()
+        self.refresh_job = self.root.after(self.plot_interval_ms, self.refresh)
+        
+    def update_display(self, feature_list):
+        display_text = "".join(
+            f"⏱️ Timestamp: {format_timestamp(features['Feature_Timestamp_ns'])}\n"
+            f"👤 Track: {features.get('Track_ID', 0)}\n"
             f"📊 Frame Rate: {features['Frame_Rate']:.2f} fps\n"
             f"📐 CoG Angle: {features['CoG_Angle']:.2f} degrees\n"
             f"🏃 Movement Rate: {features['Movement_Rate']:.4f}\n"
             "----------------------------------------\n"
+            for features in feature_list
         )
         
         self.text_display.insert(tk.END, display_text)
         self.text_display.see(tk.END)  # Auto-scroll to bottom
         
+    def on_draw(self, event):
+        # savefig() in update_graph also fires draw_event, with the animated
+        # lines rendered in; that must not become the blit background
+        if self.canvas.is_saving():
+            return
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for ax, line in zip(self.axes, self.lines):
+            ax.draw_artist(line)
+        
     def update_plots(self):
-        if not self.feature_history:
+        with self.history_lock:
+            history = list(self.feature_history)
+        if history:
+            # Plot the most recently updated person only; tracks are separate series
+            track_id = history[-1].get('Track_ID', 0)
+            history = [f for f in history if f.get('Track_ID', 0) == track_id]
+        if not history:
+            for line in self.lines:
+                line.set_data([], [])
+            self.canvas.draw()
             return
             
-        timestamps = [f['Feature_Timestamp'] for f in self.feature_history]
-        frame_rates = [f['Frame_Rate'] for f in self.feature_history]
-        cog_angles = [f['CoG_Angle'] for f in self.feature_history]
-        movement_rates = [f['Movement_Rate'] for f in self.feature_history]
-        
-        # Convert timestamps to relative time for plotting
-        try:
-            first_time = datetime.strptime(timestamps[0], "%Y-%m-%d %H:%M:%S.%f")
-            rel_times = [datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f") - 
-                         first_time for ts in timestamps
-                         ]
-            x_values = [t.total_seconds() for t in rel_times]
-        except:
-            x_values = range(len(timestamps))
+        first_time = history[0]['Feature_Monotonic_ns']
+        frame_rates = [f['Frame_Rate'] for f in history]
+        cog_angles = [f['CoG_Angle'] for f in history]
+        movement_rates = [f['Movement_Rate'] for f in history]
+        
+        # Relative time in seconds for plotting
+        x_values = [(f['Feature_Monotonic_ns'] - first_time) / 1e9 for f in history]
         
         # Update plot data
         self.line1.set_data(x_values, frame_rates)
         self.line2.set_data(x_values, cog_angles)
         self.line3.set_data(x_values, movement_rates)
         
-        # Rescale and redraw
-        for ax, data in zip([self.ax1, self.ax2, self.ax3], 
-                            [frame_rates, cog_angles, movement_rates]):
-            ax.relim()
-            ax.autoscale_view()
+        # Axes are only redrawn when the data leaves the current limits;
+        # otherwise just the three lines are blitted over the saved background
+        rescaled = False
+        for ax, data in zip(self.axes, [frame_rates, cog_angles, movement_rates]):
+            rescaled |= self.fit_limits(ax, x_values[-1], min(data), max(data))
+        
+        if rescaled or self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            for ax, line in zip(self.axes, self.lines):
+                ax.draw_artist(line)
+            self.canvas.blit(self.figure.bbox)
+        
+    def fit_limits(self, ax, x_max, y_min, y_max):
+        """Fit the axes limits (with headroom) to the data in the window.
+
+        Limits are refitted when the data leaves them, and also when the data
+        would fill less than half of them, e.g. after a spike has scrolled out
+        of the window. Otherwise they are kept so the lines can be blitted.
+        """
+        changed = False
+        x_high = x_max * 1.2 or 1.0
+        if x_max > ax.get_xlim()[1] or x_high < ax.get_xlim()[1] * 0.5:
+            ax.set_xlim(0, x_high)
+            changed = True
+        low, high = ax.get_ylim()
+        margin = (y_max - y_min) * 0.2 or 1.0
+        if y_min < low or y_max > high or (y_max - y_min + 2 * margin) < (high - low) * 0.5:
+            ax.set_ylim(y_min - margin, y_max + margin)
+            changed = True
+        return changed
+        
+    def update_graph(self):
+        """Publish the GraphImage snapshot while it has subscribers"""
+        # XPUB delivers b'\x01<topic>' on the first subscribe and b'\x00<topic>'
+        # when the last subscriber leaves
+        new_subscriber = False
+        while True:
+            try:
+                event = self.graph_socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            if event:
+                self.graph_subscribed = event[0] == 1
+                new_subscriber |= self.graph_subscribed
         
-        self.canvas.draw()
+        if not self.graph_subscribed:
+            return
+        timestamp_ns, monotonic_ns = now_ns()
+        if (not new_subscriber and self.last_graph_ns is not None and
+                elapsed_seconds(self.last_graph_ns, monotonic_ns) < self.graph_interval):
+            return
+        self.last_graph_ns = monotonic_ns
         
         # แปลงกราฟเป็นภาพและส่ง
         buf = io.BytesIO()
@@ -287,14 +388,16 @@ class FeatureCalculatorApp:
         buf.seek(0)
         img_data = base64.b64encode(buf.getvalue()).decode('utf-8')
         
-        self.graph_socket.send_string("GraphImage", zmq.SNDMORE)
+        self.graph_socket.send_string(TOPICS['graph_data'], zmq.SNDMORE)
         self.graph_socket.send_string(json.dumps({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+            "timestamp_ns": timestamp_ns,
+            "monotonic_ns": monotonic_ns,
             "frame": img_data
         }))
         
     def on_close(self):
         self.stop_calculation()
+        self.root.after_cancel(self.refresh_job)
         self.root.after(100, self.cleanup)
         self.root.destroy()
         
@@ -303,141 +406,23 @@ class FeatureCalculatorApp:
             self.pose_socket.close()
         if hasattr(self, 'feature_socket'):
             self.feature_socket.close()
+        if hasattr(self, 'graph_socket'):
+            self.graph_socket.close()
         if hasattr(self, 'context'):
             self.context.term()
         if self.csv_writer:
             self.csv_writer.close()
 
-class FeatureCalculator:
-    def __init__(self, use_real_scale=False):
-        self.prev_frame = None
-        self.prev_timestamp = None
-        self.use_real_scale = use_real_scale
-        self.connections = [
-            (0, 11), (11, 12), (12, 24), (24, 23), (23, 11),
-            (15, 13), (13, 11), (12, 14), (14, 16),
-            (23, 25), (25, 27), (24, 26), (26, 28)
-        ]
-
-    def denormalize(self, x, y, max_width, max_height):
-        """Convert from normalized to real scale"""
-        real_x = x * max_width
-        real_y = y * max_height
-        return real_x, real_y
-
-    def calculate_features(self, current_data):
-        if self.prev_frame is None:
-            self.prev_frame = current_data
-            self.prev_timestamp = current_data["Image_Timestamp"]
-            return None
-        
-        try:
-            max_width = current_data["MAX_Width"]
-            max_height = current_data["MAX_Height"]
-            
-            # Calculate Frame Rate
-            current_time = datetime.strptime(current_data["Image_Timestamp"], "%Y-%m-%d %H:%M:%S.%f")
-            prev_time = datetime.strptime(self.prev_timestamp, "%Y-%m-%d %H:%M:%S.%f")
-            time_diff = (current_time - prev_time).total_seconds()
-            frame_rate = 1 / time_diff if time_diff > 0 else 0
-            
-            # Get landmarks
-            landmarks = current_data["Landmarks"]
-            prev_landmarks = self.prev_frame["Landmarks"]
-            
-            # Center of Gravity Angle
-            left_x, left_y = landmarks[23*2], landmarks[23*2+1]
-            right_x, right_y = landmarks[24*2], landmarks[24*2+1]
-            nose_x, nose_y = landmarks[0], landmarks[1]
-            
-            if self.use_real_scale:
-                left_x, left_y = self.denormalize(left_x, left_y, max_width, max_height)
-                right_x, right_y = self.denormalize(right_x, right_y, max_width, max_height)
-                nose_x, nose_y = self.denormalize(nose_x, nose_y, max_width, max_height)
-            
-            cog_x = (right_x + left_x) / 2
-            cog_y = (right_y + left_y) / 2
-            dx = cog_x - nose_x
-            dy = cog_y - nose_y
-            cog_angle = np.arctan2(abs(dy), abs(dx)) * (180 / np.pi)
-            
-            # Calculate Movement Rate
-            total_distance = 0.0
-            num_connections = len(self.connections)
-            
-            for conn in self.connections:
-                x1, y1 = landmarks[conn[0]*2], landmarks[conn[0]*2+1]
-                x2, y2 = landmarks[conn[1]*2], landmarks[conn[1]*2+1]
-                x1_prev, y1_prev = prev_landmarks[conn[0]*2], prev_landmarks[conn[0]*2+1]
-                x2_prev, y2_prev = prev_landmarks[conn[1]*2], prev_landmarks[conn[1]*2+1]
-                
-                if self.use_real_scale:
-                    x1, y1 = self.denormalize(x1, y1, max_width, max_height)
-                    x2, y2 = self.denormalize(x2, y2, max_width, max_height)
-                    x1_prev, y1_prev = self.denormalize(x1_prev, y1_prev, max_width, max_height)
-                    x2_prev, y2_prev = self.denormalize(x2_prev, y2_prev, max_width, max_height)
-                
-                start_point_diff = np.sqrt((x1 - x1_prev)**2 + (y1 - y1_prev)**2)
-                end_point_diff = np.sqrt((x2 - x2_prev)**2 + (y2 - y2_prev)**2)
-                total_distance += (start_point_diff + end_point_diff) / 2
-            
-            avg_distance = total_distance / num_connections
-            movement_rate = avg_distance / time_diff if time_diff > 0 else 0.0
-            
-            # Update previous frame
-            self.prev_frame = current_data
-            self.prev_timestamp = current_data["Image_Timestamp"]
-            
-            return {
-                "Feature_Timestamp": current_data["Image_Timestamp"],
-                "Frame_Rate": frame_rate,
-                "CoG_Angle": cog_angle,
-                "Movement_Rate": movement_rate
-            }
-            
-        except Exception as e:
-            print(f"Error calculating features: {e}")
-            return None
-
-class CSVWriter:
-    def __init__(self, filename="feature_data.csv"):
-        self.filename = filename
-        self.file = None
-        self.writer = None
-        self.is_first_write = True
-        
-    def open(self):
-        file_exists = os.path.isfile(self.filename)
-        
-        self.file = open(self.filename, mode='a', newline='')
-        self.writer = csv.writer(self.file)
-        
-        if not file_exists or os.stat(self.filename).st_size == 0:
-            self.writer.writerow(["Timestamp", "Frame_Rate", "CoG_Angle", "Movement_Rate"])
-            self.is_first_write = False
-    
-    def write(self, feature_data):
-        if self.writer is None:
-            self.open()
-        
-        try:
-            self.writer.writerow([
-                feature_data["Feature_Timestamp"],
-                feature_data["Frame_Rate"],
-                feature_data["CoG_Angle"],
-                feature_data["Movement_Rate"]
-            ])
-            self.file.flush()
-        except Exception as e:
-            print(f"Error writing to CSV: {e}")
-    
-    def close(self):
-        if self.file is not None:
-            self.file.close()
-
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feature calculator with live plots")
+    parser.add_argument("--plot-hz", type=float, default=5.0,
+                        help="text and plot refresh rate")
+    parser.add_argument("--graph-interval", type=float, default=1.0,
+                        help="seconds between GraphImage snapshots while subscribed")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = FeatureCalculatorApp(root)
+    app = FeatureCalculatorApp(root, plot_hz=args.plot_hz, graph_interval=args.graph_interval)
     
     # Handle window close event
     root.protocol("WM_DELETE_WINDOW", app.on_close)
@@ -0,0 +1,127 @@
+"""Offline feature engine: computes features for a whole pose recording at once.
+
+The recording is a CSV with landmark columns x0, y0 ... x32, y32 (extra
+columns such as z are ignored) and either the live pipeline's
+Image_Timestamp_ns/Image_Monotonic_ns columns or an older Image_Timestamp
+column. Every frame n is
+compared with frame n - 1 using shifted arrays and the formulas in
+feature_math.py, so the numbers match the live FeatureCalculator.
+
+    python feature_batch.py recording.csv --out features.csv
+    python feature_batch.py recording.csv --threshold 5 --machine-frame-rate
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from feature_math import NUM_LANDMARKS, cog_angle, connection_displacement, frame_and_movement_rate
+from timestamps import TIMESTAMP_FORMAT
+
+LANDMARK_COLUMNS = [f"{axis}{i}" for i in range(NUM_LANDMARKS) for axis in ("x", "y")]
+# input timestamp column -> output column, in order of preference
+TIMESTAMP_COLUMNS = {
+    'Image_Timestamp_ns': 'Feature_Timestamp_ns',
+    'Image_Monotonic_ns': 'Feature_Monotonic_ns',
+    'Image_Timestamp': 'Feature_Timestamp',
+}
+
+
+def landmark_array(data, scale=None):
+    """Landmark columns as a (frames, 33, 2) array, optionally multiplied by (width, height)"""
+    points = data[LANDMARK_COLUMNS].to_numpy(dtype=float).reshape(len(data), NUM_LANDMARKS, 2)
+    if scale is not None:
+        points = points * np.asarray(scale, dtype=float)
+    return points
+
+
+def timestamp_column(data):
+    """The first of TIMESTAMP_COLUMNS present in the recording; ValueError if none is"""
+    for column in TIMESTAMP_COLUMNS:
+        if column in data.columns:
+            return column
+    raise ValueError(f"Recording has no timestamp column, expected one of {list(TIMESTAMP_COLUMNS)}")
+
+
+def time_diffs(data):
+    """Seconds between consecutive frames.
+
+    Image_Monotonic_ns is used when present, exactly like the live calculator,
+    then Image_Timestamp_ns. Otherwise a numeric Image_Timestamp is taken as
+    seconds (semester_1 recordings) and a text one is parsed with
+    TIMESTAMP_FORMAT.
+    """
+    if 'Image_Monotonic_ns' in data.columns:
+        ns = data['Image_Monotonic_ns'].to_numpy(dtype=np.int64)
+        return (ns[1:] - ns[:-1]) / 1e9
+    if 'Image_Timestamp_ns' in data.columns:
+        ns = data['Image_Timestamp_ns'].to_numpy(dtype=np.int64)
+        return (ns[1:] - ns[:-1]) / 1e9
+
+    timestamps = data[timestamp_column(data)]
+    if pd.api.types.is_numeric_dtype(timestamps):
+        seconds = timestamps.to_numpy(dtype=float)
+        return seconds[1:] - seconds[:-1]
+    ns = pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT).to_numpy().astype(np.int64)
+    return (ns[1:] - ns[:-1]) / 1e9
+
+
+def compute_features(data, frame_rate_threshold=None, use_machine_frame_rate=False, scale=None):
+    """Frame_Rate, CoG_Angle and Movement_Rate for every frame after the first.
+
+    frame_rate_threshold: rows whose Frame_Rate is below it are written as 0
+    use_machine_frame_rate: ignore timestamps and treat frames as 1 second apart
+    scale: (width, height) to convert normalized landmarks to pixels
+
+    The output timestamp column follows the input (see TIMESTAMP_COLUMNS);
+    ValueError if the recording has none of them.
+    """
+    if len(data) < 2:
+        return pd.DataFrame(columns=['Frame_Rate', 'CoG_Angle', 'Movement_Rate'])
+
+    points = landmark_array(data, scale)
+    if use_machine_frame_rate:
+        time_diff = np.ones(len(data) - 1)
+    else:
+        time_diff = time_diffs(data)
+
+    frame_rate, movement_rate = frame_and_movement_rate(
+        connection_displacement(points[1:], points[:-1]), time_diff)
+    angle = cog_angle(points[1:])
+
+    if frame_rate_threshold is not None:
+        skipped = frame_rate < frame_rate_threshold
+        frame_rate[skipped] = 0
+        angle[skipped] = 0
+        movement_rate[skipped] = 0
+
+    column = timestamp_column(data)
+    return pd.DataFrame({
+        TIMESTAMP_COLUMNS[column]: data[column].to_numpy()[1:],
+        'Frame_Rate': frame_rate,
+        'CoG_Angle': angle,
+        'Movement_Rate': movement_rate
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute features for a whole pose recording")
+    parser.add_argument("input", help="pose CSV with timestamp and x0..y32 columns")
+    parser.add_argument("--out", default=None, help="output CSV (default: <input>_features.csv)")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="write 0 for frames whose Frame_Rate is below this value")
+    parser.add_argument("--machine-frame-rate", action="store_true",
+                        help="ignore timestamps (frame rate = 1)")
+    parser.add_argument("--scale", type=float, nargs=2, metavar=("WIDTH", "HEIGHT"), default=None,
+                        help="convert normalized landmarks to pixels")
+    args = parser.parse_args()
+
+    features = compute_features(
+        pd.read_csv(args.input),
+        frame_rate_threshold=args.threshold,
+        use_machine_frame_rate=args.machine_frame_rate,
+        scale=args.scale
+    )
+    out = args.out or args.input.rsplit('.', 1)[0] + "_features.csv"
+    features.to_csv(out, index=False)
+    print(f"Saved {len(features)} rows to {out}")
@@ -0,0 +1,52 @@
+"""Feature formulas shared by the live FeatureCalculator and the offline
+batch engine (feature_batch.py), so both produce identical numbers.
+
+All functions accept landmark arrays of shape (..., 33, 2): a single frame or
+a whole recording at once.
+"""
+import numpy as np
+
+# Body connections used for Movement Rate
+CONNECTIONS = [
+    (0, 11), (11, 12), (12, 24), (24, 23), (23, 11),
+    (15, 13), (13, 11), (12, 14), (14, 16),
+    (23, 25), (25, 27), (24, 26), (26, 28)
+]
+CONNECTION_START = np.array([conn[0] for conn in CONNECTIONS])
+CONNECTION_END = np.array([conn[1] for conn in CONNECTIONS])
+NUM_LANDMARKS = 33
+
+
+def cog_angle(points):
+    """Center of Gravity angle in degrees.
+
+    points has shape (..., 33, 2); the angle is between the nose and the
+    midpoint of the hips (landmarks 23 and 24).
+    """
+    cog = (points[..., 24, :] + points[..., 23, :]) / 2
+    delta = np.abs(cog - points[..., 0, :])
+    return np.arctan2(delta[..., 1], delta[..., 0]) * (180 / np.pi)
+
+
+def connection_displacement(points, prev_points):
+    """Average distance the ends of each body connection moved between two frames.
+
+    Both arguments have shape (..., 33, 2); the result has shape (...).
+    """
+    diff = points - prev_points
+    point_diff = np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2)
+    connection_diff = (point_diff[..., CONNECTION_START] + point_diff[..., CONNECTION_END]) / 2
+    # cumsum adds left to right like the original loop, so results match bit for bit
+    return np.cumsum(connection_diff, axis=-1)[..., -1] / len(CONNECTIONS)
+
+
+def frame_and_movement_rate(displacement, time_diff):
+    """Frame_Rate (1 / seconds between frames) and Movement_Rate (displacement per second).
+
+    Both are 0 where time_diff is not positive. Works on scalars and arrays.
+    """
+    time_diff = np.asarray(time_diff, dtype=float)
+    valid = time_diff > 0
+    frame_rate = np.divide(1.0, time_diff, out=np.zeros(time_diff.shape), where=valid)
+    movement_rate = np.divide(displacement, time_diff, out=np.zeros(time_diff.shape), where=valid)
+    return frame_rate, movement_rate
@@ -0,0 +1,218 @@
+"""Headless feature calculator: feature.py without the Tk window and plots.
+
+    python feature_service.py
+    python feature_service.py --real-scale --csv feature_data.csv
+
+PoseData from the multi-person pose path carries a Track_ID; every track gets
+its own FeatureCalculator (TrackedFeatureCalculator) and FeatureData carries
+the same Track_ID.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import zmq
+
+from config import TOPICS, TOPOLOGY
+from timestamps import elapsed_seconds, format_timestamp
+from tracker import TrackTable
+from feature_math import NUM_LANDMARKS, cog_angle, connection_displacement, frame_and_movement_rate
+
+
+class FeatureCalculator:
+    def __init__(self, use_real_scale=False):
+        self.prev_monotonic_ns = None
+        self.use_real_scale = use_real_scale
+        # Landmark buffers are reused for every frame and swapped after each one
+        self.points = np.zeros((NUM_LANDMARKS, 2))
+        self.prev_points = np.zeros((NUM_LANDMARKS, 2))
+        self.scaled_points = np.zeros((NUM_LANDMARKS, 2))
+        self.scaled_prev_points = np.zeros((NUM_LANDMARKS, 2))
+        self.scale = np.ones(2)
+
+    def calculate_features(self, current_data):
+        try:
+            self.points.flat[:] = current_data["Landmarks"]
+        except Exception as e:
+            print(f"Error calculating features: {e}")
+            return None
+
+        if self.prev_monotonic_ns is None:
+            self.points, self.prev_points = self.prev_points, self.points
+            self.prev_monotonic_ns = current_data["Image_Monotonic_ns"]
+            return None
+        
+        try:
+            # Time between frames, from the capture-side monotonic clock
+            time_diff = elapsed_seconds(self.prev_monotonic_ns, current_data["Image_Monotonic_ns"])
+            
+            points, prev_points = self.points, self.prev_points
+            if self.use_real_scale:
+                # Both frames use the current frame size, as before
+                self.scale[0] = current_data["MAX_Width"]
+                self.scale[1] = current_data["MAX_Height"]
+                points = np.multiply(points, self.scale, out=self.scaled_points)
+                prev_points = np.multiply(prev_points, self.scale, out=self.scaled_prev_points)
+            
+            # Center of Gravity Angle
+            angle = float(cog_angle(points))
+            
+            # Calculate Frame Rate and Movement Rate
+            frame_rate, movement_rate = frame_and_movement_rate(
+                connection_displacement(points, prev_points), time_diff)
+            
+            # Update previous frame
+            self.points, self.prev_points = self.prev_points, self.points
+            self.prev_monotonic_ns = current_data["Image_Monotonic_ns"]
+            
+            return {
+                "Feature_Timestamp_ns": current_data["Image_Timestamp_ns"],
+                "Feature_Monotonic_ns": current_data["Image_Monotonic_ns"],
+                "Frame_Rate": float(frame_rate),
+                "CoG_Angle": angle,
+                "Movement_Rate": float(movement_rate)
+            }
+            
+        except Exception as e:
+            print(f"Error calculating features: {e}")
+            return None
+
+class TrackedFeatureCalculator:
+    """One FeatureCalculator per Track_ID, so movement is never measured between two people.
+
+    Calculators live in a TrackTable: at most `max_tracks`, and a track not
+    seen for `max_idle` seconds starts again from its next frame.
+    """
+
+    def __init__(self, use_real_scale=False, max_tracks=16, max_idle=5.0):
+        self.use_real_scale = use_real_scale
+        self.calculators = TrackTable(
+            lambda: FeatureCalculator(use_real_scale=self.use_real_scale),
+            max_tracks=max_tracks,
+            max_idle=max_idle
+        )
+
+    def calculate_features(self, current_data):
+        # Single-person PoseData (and older senders) count as track 0
+        track_id = current_data.get("Track_ID", 0)
+        monotonic_ns = current_data.get("Image_Monotonic_ns", 0)
+        self.calculators.evict_idle(monotonic_ns)
+
+        features = self.calculators.get(track_id, monotonic_ns).calculate_features(current_data)
+        if features:
+            features["Track_ID"] = track_id
+        return features
+
+
+class CSVWriter:
+    """Appends FeatureData rows, with the Track_ID so rows of different people can be separated.
+
+    A file written before the Track_ID column existed keeps its own header.
+    """
+
+    COLUMNS = ["Timestamp", "Frame_Rate", "CoG_Angle", "Movement_Rate", "Track_ID"]
+
+    def __init__(self, filename="feature_data.csv"):
+        self.filename = filename
+        self.file = None
+        self.writer = None
+        self.columns = self.COLUMNS
+        self.is_first_write = True
+        
+    def open(self):
+        file_exists = os.path.isfile(self.filename) and os.stat(self.filename).st_size > 0
+        if file_exists:
+            with open(self.filename, newline='') as f:
+                self.columns = next(csv.reader(f), self.COLUMNS)
+            if "Track_ID" not in self.columns:
+                print(f"{self.filename} has no Track_ID column; rows are appended without it")
+        
+        self.file = open(self.filename, mode='a', newline='')
+        self.writer = csv.writer(self.file)
+        
+        if not file_exists:
+            self.writer.writerow(self.columns)
+            self.is_first_write = False
+    
+    def write(self, feature_data):
+        if self.writer is None:
+            self.open()
+        
+        try:
+            row = {
+                "Timestamp": format_timestamp(feature_data["Feature_Timestamp_ns"]),
+                "Frame_Rate": feature_data["Frame_Rate"],
+                "CoG_Angle": feature_data["CoG_Angle"],
+                "Movement_Rate": feature_data["Movement_Rate"],
+                "Track_ID": feature_data.get("Track_ID", 0)
+            }
+            self.writer.writerow([row.get(column, "") for column in self.columns])
+            self.file.flush()
+        except Exception as e:
+            print(f"Error writing to CSV: {e}")
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class FeatureService:
+    def __init__(self, use_real_scale=False, csv_filename=None):
+        self.calculator = TrackedFeatureCalculator(use_real_scale=use_real_scale)
+        self.csv_writer = CSVWriter(csv_filename) if csv_filename else None
+
+        self.context = zmq.Context()
+        self.pose_socket = self.context.socket(zmq.SUB)
+        TOPOLOGY.configure_socket(self.pose_socket, 'pose_data')
+        self.pose_socket.connect(TOPOLOGY.connect_address('pose_data'))
+        self.pose_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['pose_data'])
+
+        self.feature_socket = self.context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.feature_socket, 'feature_data')
+        self.feature_socket.bind(TOPOLOGY.bind_address('feature_data'))
+
+    def run(self):
+        print("Calculating features...")
+        count = 0
+        last_report = time.time()
+        try:
+            while True:
+                topic = self.pose_socket.recv_string()
+                pose_data = json.loads(self.pose_socket.recv_string())
+
+                features = self.calculator.calculate_features(pose_data)
+                if features:
+                    self.feature_socket.send_string(TOPICS['feature_data'], zmq.SNDMORE)
+                    self.feature_socket.send_string(json.dumps(features))
+                    if self.csv_writer:
+                        self.csv_writer.write(features)
+                    count += 1
+
+                if time.time() - last_report >= 5.0:
+                    print(f"FeatureData: {count / (time.time() - last_report):.1f}/s")
+                    count = 0
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            print("Program terminated by user")
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        self.pose_socket.close()
+        self.feature_socket.close()
+        self.context.term()
+        if self.csv_writer:
+            self.csv_writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless feature calculator")
+    parser.add_argument("--real-scale", action="store_true",
+                        help="compute features in pixels instead of normalized coordinates")
+    parser.add_argument("--csv", default=None, help="append features to this CSV file")
+    args = parser.parse_args()
+
+    FeatureService(use_real_scale=args.real_scale, csv_filename=args.csv).run()
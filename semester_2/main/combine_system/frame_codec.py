@@ -0,0 +1,168 @@
+"""Binary wire format for the Sender_frame topic.
+
+A frame message is sent as three ZMQ frames:
+
+    [topic, header, payload]
+
+The header is a small fixed-size struct (see HEADER) and the payload is the
+encoded image bytes, sent zero-copy so no base64/JSON round trip is needed.
+"""
+import struct
+from collections import namedtuple
+
+import cv2
+import numpy as np
+import zmq
+
+from config import TOPICS
+from frame_ring import FrameRing
+from timestamps import now_ns
+
+FRAME_TOPIC = TOPICS['frames'].encode()
+
+MAGIC = b"FD"
+VERSION = 2
+
+# Payload codecs
+CODEC_JPEG = 1
+CODEC_RAW = 2  # raw BGR bytes, height * width * channels
+CODEC_SHM = 3  # payload is only a slot index into a FrameRing (see frame_ring.py)
+
+# magic, version, codec, seq, timestamp_ns (wall clock), monotonic_ns,
+# height, width, channels, padding
+HEADER = struct.Struct("<2sBBQQQHHBx")
+
+# CODEC_SHM payload: slot index, generation of the ring it was written to
+SLOT = struct.Struct("<IQ")
+
+FrameHeader = namedtuple(
+    "FrameHeader",
+    ["version", "codec", "seq", "timestamp_ns", "monotonic_ns", "height", "width", "channels"]
+)
+
+
+def encode_header(codec, seq, timestamp_ns, monotonic_ns, height, width, channels=3):
+    """Pack a frame header into bytes"""
+    return HEADER.pack(MAGIC, VERSION, codec, seq, timestamp_ns, monotonic_ns, height, width, channels)
+
+
+def decode_header(buf):
+    """Unpack a frame header, raising ValueError on foreign or newer messages"""
+    if len(buf) != HEADER.size:
+        raise ValueError(f"Bad frame header size: {len(buf)}")
+    magic, version, codec, seq, timestamp_ns, monotonic_ns, height, width, channels = HEADER.unpack(buf)
+    if magic != MAGIC:
+        raise ValueError("Not a frame message (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"Unsupported frame header version: {version}")
+    return FrameHeader(version, codec, seq, timestamp_ns, monotonic_ns, height, width, channels)
+
+
+def send_frame(socket, frame, seq, timestamps=None, codec=CODEC_JPEG, jpeg_quality=None, flags=0):
+    """Encode a BGR frame and publish it on the Sender_frame topic.
+
+    timestamps is the (wall-clock ns, monotonic ns) pair of the capture,
+    defaulting to now.
+    """
+    timestamp_ns, monotonic_ns = timestamps or now_ns()
+    height, width = frame.shape[:2]
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+
+    if codec == CODEC_JPEG:
+        params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if jpeg_quality else []
+        ok, payload = cv2.imencode('.jpg', frame, params)
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+    elif codec == CODEC_RAW:
+        payload = np.ascontiguousarray(frame)
+    else:
+        raise ValueError(f"Unknown codec: {codec}")
+
+    header = encode_header(codec, seq, timestamp_ns, monotonic_ns, height, width, channels)
+    # copy=False hands the encoded buffer to libzmq without another copy
+    socket.send_multipart([FRAME_TOPIC, header, payload], flags=flags, copy=False)
+
+
+def send_frame_slot(socket, ring, frame, seq, timestamps=None, flags=0):
+    """Write a frame into a shared-memory ring and publish only its slot index"""
+    timestamp_ns, monotonic_ns = timestamps or now_ns()
+    slot = ring.write(frame, seq, timestamp_ns)
+    height, width = frame.shape[:2]
+    header = encode_header(CODEC_SHM, seq, timestamp_ns, monotonic_ns, height, width, ring.channels)
+    socket.send_multipart([FRAME_TOPIC, header, SLOT.pack(slot, ring.generation)], flags=flags)
+
+
+def recv_frame(socket, flags=0):
+    """Receive one frame message. Returns (FrameHeader, payload memoryview)"""
+    parts = socket.recv_multipart(flags=flags, copy=False)
+    if len(parts) != 3:
+        raise ValueError(f"Expected 3 message parts, got {len(parts)}")
+    header = decode_header(parts[1].bytes)
+    return header, parts[2].buffer
+
+
+def recv_latest_frame(socket):
+    """Block for a frame message, then drain the queue and keep only the newest.
+
+    Returns (FrameHeader, payload, skipped) where skipped is the number of
+    queued frames that were dropped. ZMQ_CONFLATE cannot be used here because
+    it does not support multipart messages.
+    """
+    parts = socket.recv_multipart(copy=False)
+    skipped = 0
+    while True:
+        try:
+            newer = socket.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+        except zmq.Again:
+            break
+        parts = newer
+        skipped += 1
+    if len(parts) != 3:
+        raise ValueError(f"Expected 3 message parts, got {len(parts)}")
+    return decode_header(parts[1].bytes), parts[2].buffer, skipped
+
+
+def decode_frame(header, payload, ring=None):
+    """Turn a received payload back into a BGR image.
+
+    CODEC_SHM frames need the attached FrameRing and come back as a read-only
+    view, or None if the producer has already reused the slot.
+    """
+    if header.codec == CODEC_SHM:
+        if ring is None:
+            raise ValueError("Shared-memory frame received without an attached frame ring")
+        slot, generation = frame_slot(payload)
+        return ring.read(slot, header.seq, generation)
+
+    data = np.frombuffer(payload, dtype=np.uint8)
+    if header.codec == CODEC_JPEG:
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if header.codec == CODEC_RAW:
+        return data.reshape(header.height, header.width, header.channels)
+    raise ValueError(f"Unknown codec: {header.codec}")
+
+
+def frame_slot(payload):
+    """(slot index, ring generation) carried by a CODEC_SHM payload"""
+    return SLOT.unpack(bytes(payload))
+
+
+def attach_ring(ring, header, payload, name):
+    """The FrameRing for a received frame: ring itself, or a fresh attach when the
+    frame comes from a ring the producer created since (e.g. after a restart)"""
+    if header.codec != CODEC_SHM:
+        return ring
+    _, generation = frame_slot(payload)
+    if ring is None or ring.generation != generation:
+        if ring is not None:
+            ring.close()
+        ring = FrameRing.attach(name)
+    return ring
+
+
+def frame_is_current(ring, header, payload):
+    """False once a CODEC_SHM frame's slot has been overwritten; other codecs are always current"""
+    if header.codec != CODEC_SHM:
+        return True
+    slot, generation = frame_slot(payload)
+    return ring.is_current(slot, header.seq, generation)
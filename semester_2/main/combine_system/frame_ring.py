@@ -0,0 +1,149 @@
+"""Shared-memory ring of raw BGR frames for stages running on the same host.
+
+The producer copies each frame into a fixed slot (seq % slots) and publishes
+only a small notification on Sender_frame (codec CODEC_SHM, see frame_codec).
+Consumers map the same segment and get a read-only numpy view of the slot.
+
+Memory layout:
+
+    ring header | slot 0 header | slot 0 pixels | slot 1 header | ...
+
+Every slot header holds the sequence number of the frame stored in it. The
+producer sets it to WRITING while copying pixels, so a consumer can call
+is_current() after using a view to detect that the slot was overwritten.
+
+Every ring also gets a random generation when it is created, and each frame
+notification carries it. A restarted producer replaces the segment, but a
+consumer that attached earlier still maps the old one. read() and
+is_current() reject frames of another generation, and the consumer then
+re-attaches (see frame_codec.attach_ring).
+"""
+import os
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+RING_MAGIC = b"FDRB"
+RING_VERSION = 2
+
+# magic, version, slots, max_height, max_width, channels, generation
+RING_HEADER = struct.Struct("<4sIIIIIQ")
+# seq, timestamp_ns, height, width, channels
+SLOT_HEADER = struct.Struct("<QQHHB")
+
+HEADER_SIZE = 64  # both headers are padded so pixel data stays aligned
+WRITING = 2**64 - 1
+
+
+def _open_segment(name):
+    """Attach to an existing segment without letting this process unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            # Older Pythons register attached segments with the resource
+            # tracker, which would destroy the producer's ring when we exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        magic, version, slots, max_height, max_width, channels, generation = RING_HEADER.unpack_from(shm.buf, 0)
+        if magic != RING_MAGIC or version != RING_VERSION:
+            raise ValueError(f"Shared memory '{shm.name}' is not a frame ring")
+        self.slots = slots
+        self.max_height = max_height
+        self.max_width = max_width
+        self.channels = channels
+        self.generation = generation
+        self.frame_bytes = max_height * max_width * channels
+        self.slot_size = HEADER_SIZE + self.frame_bytes
+
+    @classmethod
+    def create(cls, name, slots, max_height, max_width, channels=3):
+        """Create (or replace a stale) ring. Only the producer should call this"""
+        size = HEADER_SIZE + slots * (HEADER_SIZE + max_height * max_width * channels)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a producer that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        generation = int.from_bytes(os.urandom(8), 'little') or 1
+        RING_HEADER.pack_into(shm.buf, 0, RING_MAGIC, RING_VERSION, slots, max_height, max_width, channels,
+                              generation)
+        ring = cls(shm, owner=True)
+        for slot in range(slots):
+            SLOT_HEADER.pack_into(shm.buf, ring._slot_offset(slot), WRITING, 0, 0, 0, 0)
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Map an existing ring created by the producer"""
+        return cls(_open_segment(name), owner=False)
+
+    def _slot_offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    def _slot_array(self, slot, height, width, channels):
+        return np.ndarray(
+            (height, width, channels),
+            dtype=np.uint8,
+            buffer=self.shm.buf,
+            offset=self._slot_offset(slot) + HEADER_SIZE
+        )
+
+    def fits(self, frame):
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        return height <= self.max_height and width <= self.max_width and channels == self.channels
+
+    def write(self, frame, seq, timestamp_ns):
+        """Copy a frame into its slot and return the slot index"""
+        if not self.fits(frame):
+            raise ValueError(f"Frame {frame.shape} does not fit ring slots "
+                             f"({self.max_height}, {self.max_width}, {self.channels})")
+        height, width = frame.shape[:2]
+        slot = seq % self.slots
+        offset = self._slot_offset(slot)
+
+        SLOT_HEADER.pack_into(self.shm.buf, offset, WRITING, 0, 0, 0, 0)
+        self._slot_array(slot, height, width, self.channels)[:] = frame
+        SLOT_HEADER.pack_into(self.shm.buf, offset, seq, timestamp_ns, height, width, self.channels)
+        return slot
+
+    def read(self, slot, seq, generation):
+        """Return a read-only view of the frame in a slot, or None if it was already overwritten
+        or was written to a ring of another generation"""
+        if generation != self.generation:
+            return None
+        slot_seq, _, height, width, channels = SLOT_HEADER.unpack_from(self.shm.buf, self._slot_offset(slot))
+        if slot_seq != seq:
+            return None
+        view = self._slot_array(slot, height, width, channels)
+        view.flags.writeable = False
+        return view
+
+    def is_current(self, slot, seq, generation):
+        """True while the slot still holds frame seq (call after using a view from read)"""
+        return (generation == self.generation and
+                SLOT_HEADER.unpack_from(self.shm.buf, self._slot_offset(slot))[0] == seq)
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view returned by read() is still alive; the mapping is
+            # released when the process exits
+            pass
+        if self.owner:
+            self.shm.unlink()
@@ -1,13 +1,10 @@
 import cv2
 import zmq
-import base64
-import json
-from datetime import datetime
-import time
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from threading import Thread, Event
 from PIL import Image, ImageTk
+from capture import FrameGrabber, FramePublisher, RateCounter
 
 class VideoSenderApp:
     def __init__(self, root):
@@ -17,6 +14,7 @@ class VideoSenderApp:
         self.show_fps = True
         self.stop_event = Event()
         self.cap = None
+        self.grabber = None
         self.frame_delay = 1/30  # Default frame delay for 30 FPS
         
         self.setup_ui()
@@ -49,7 +47,7 @@ class VideoSenderApp:
         status_bar.pack(fill=tk.X, pady=(5, 0))
         
         ttk.Label(status_bar, textvariable=self.status_var, relief=tk.SUNKEN, width=50).pack(side=tk.LEFT, fill=tk.X, expand=True)
-        ttk.Label(status_bar, textvariable=self.fps_var, relief=tk.SUNKEN, width=15).pack(side=tk.RIGHT)
+        ttk.Label(status_bar, textvariable=self.fps_var, relief=tk.SUNKEN, width=40).pack(side=tk.RIGHT)
         
         # Source selection
         source_frame = ttk.Frame(control_frame)
@@ -84,15 +82,15 @@ class VideoSenderApp:
         self.fps_toggle = ttk.Checkbutton(btn_frame, text="Show FPS", command=self.toggle_fps, variable=tk.BooleanVar(value=True))
         self.fps_toggle.pack(side=tk.LEFT, padx=5)
         
+        # Same-host consumers read raw frames from shared memory instead of JPEG
+        self.shm_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_frame, text="Shared Memory", variable=self.shm_var).pack(side=tk.LEFT, padx=5)
+        
         ttk.Button(btn_frame, text="Exit", command=self.on_close).pack(side=tk.RIGHT, padx=5)
         
     def setup_zmq(self):
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.PUB)
-        self.socket.bind("tcp://*:5555")
-
-        self.fps_socket = self.context.socket(zmq.PUB)
-        self.fps_socket.bind("tcp://*:5551")
+        self.publisher = FramePublisher(self.context)
         
     def browse_file(self):
         if self.source_var.get() == "file":
@@ -122,6 +120,10 @@ class VideoSenderApp:
         if not cap.isOpened():
             messagebox.showerror("Error", f"Cannot open video source: {source}")
             return None
+        
+        # Keep the driver buffer small for live sources; FrameGrabber does the buffering
+        if self.source_var.get() != "file":
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             
         # Get original FPS
         original_fps = cap.get(cv2.CAP_PROP_FPS)
@@ -136,6 +138,16 @@ class VideoSenderApp:
             self.cap = self.open_video_source()
             if self.cap is None:
                 return
+            
+            self.publisher.use_shm = False
+            if self.shm_var.get():
+                try:
+                    self.publisher.enable_shm()
+                except Exception as e:
+                    messagebox.showerror("Error", f"Cannot create shared memory: {str(e)}")
+                    self.cap.release()
+                    self.cap = None
+                    return
                 
             self.running = True
             self.stop_event.clear()
@@ -143,9 +155,15 @@ class VideoSenderApp:
             self.stop_btn.config(state=tk.NORMAL)
             self.status_var.set("Running - Sending frames...")
             
-            # Initialize FPS counter
-            self.start_time = time.time()
-            self.frame_count = 0
+            # Capture runs on its own thread; send_frames encodes and publishes
+            is_file = self.source_var.get() == "file"
+            self.grabber = FrameGrabber(
+                self.cap,
+                max_frames=2,
+                loop=is_file,
+                frame_delay=self.frame_delay if is_file else 0.0
+            )
+            self.grabber.start()
             
             Thread(target=self.send_frames, daemon=True).start()
             
@@ -157,6 +175,10 @@ class VideoSenderApp:
             self.stop_btn.config(state=tk.DISABLED)
             self.status_var.set("Stopped")
             
+            if self.grabber:
+                self.grabber.stop()
+                self.grabber = None
+                
             if self.cap:
                 self.cap.release()
                 self.cap = None
@@ -173,67 +195,31 @@ class VideoSenderApp:
         self.show_fps = not self.show_fps
         
     def send_frames(self):
-        while not self.stop_event.is_set() and self.cap is not None:
-            start_time = time.time()
-            
-            ret, frame = self.cap.read()
-            if not ret:
-                if self.source_var.get() == "file":
-                    # For video files, loop when reaching the end
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    continue
-                else:
+        grabber = self.grabber
+        publish_rate = RateCounter()
+        while not self.stop_event.is_set():
+            item = grabber.get(timeout=0.5)
+            if item is None:
+                if grabber.finished:
                     break
-
-            # Convert frame to base64 string
-            _, buffer = cv2.imencode('.jpg', frame)
-            jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-
-            # Add timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-
-            # Create data to send
-            data = {
-                "timestamp": timestamp,
-                "frame": jpg_as_text
-            }
-
-            # Convert to JSON
-            data_json = json.dumps(data)
+                continue
+            frame, timestamps = item
 
             # Send through ZeroMQ
-            self.socket.send_string("Sender_frame", zmq.SNDMORE)
-            self.socket.send_string(data_json)
+            self.publisher.publish(frame, timestamps)
 
-            # Calculate FPS
-            self.frame_count += 1
-            elapsed_time = time.time() - self.start_time
-
-            if elapsed_time >= 1.0:  # Calculate FPS every second
-                fps = self.frame_count / elapsed_time
-                self.start_time = time.time()
-                self.frame_count = 0
-
-                # Send FPS data
-                fps_data = {
-                    "timestamp": timestamp,
-                    "fps": fps
-                }
-                fps_json = json.dumps(fps_data)
-                self.fps_socket.send_string("FPS", zmq.SNDMORE)
-                self.fps_socket.send_string(fps_json)
+            # Calculate FPS every second
+            fps = publish_rate.tick()
+            if fps is not None:
+                # Send FPS data for both stages
+                self.publisher.publish_fps(timestamps, fps, grabber)
 
                 # Update FPS display
-                self.fps_var.set(f"FPS: {fps:.2f}")
+                self.fps_var.set(f"FPS: {fps:.2f} (capture {grabber.fps:.2f}, dropped {grabber.dropped})")
 
             # Display frame if enabled
             if self.show_video:
                 self.display_frame(frame)
-
-            # Delay to maintain frame rate
-            elapsed_time = time.time() - start_time
-            if elapsed_time < self.frame_delay:
-                time.sleep(self.frame_delay - elapsed_time)
                 
         if not self.stop_event.is_set():
             self.status_var.set("Error reading frames")
@@ -264,10 +250,8 @@ class VideoSenderApp:
         self.root.destroy()
         
     def cleanup(self):
-        if hasattr(self, 'socket'):
-            self.socket.close()
-        if hasattr(self, 'fps_socket'):
-            self.fps_socket.close()
+        if hasattr(self, 'publisher'):
+            self.publisher.close()
         if hasattr(self, 'context'):
             self.context.term()
         cv2.destroyAllWindows()
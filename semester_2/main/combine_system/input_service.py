@@ -0,0 +1,94 @@
+"""Headless video sender: input.py without the Tk window.
+
+    python input_service.py --source 0
+    python input_service.py --source rtsp://camera/stream --shm
+    python input_service.py --source 1.mp4
+"""
+import argparse
+import os
+
+import cv2
+import zmq
+
+from capture import FrameGrabber, FramePublisher, RateCounter
+
+
+class VideoSenderService:
+    def __init__(self, source, use_shm=False, max_frames=2):
+        self.source = source
+        self.max_frames = max_frames
+        self.context = zmq.Context()
+        self.publisher = FramePublisher(self.context)
+        if use_shm:
+            self.publisher.enable_shm()
+        self.cap = None
+        self.grabber = None
+
+    def open_video_source(self):
+        source = int(self.source) if self.source.isdigit() else self.source
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise RuntimeError(f"Cannot open video source: {self.source}")
+
+        is_file = os.path.isfile(self.source)
+        if not is_file:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        # Video files are paced at their own frame rate and looped
+        original_fps = cap.get(cv2.CAP_PROP_FPS)
+        if original_fps <= 0:
+            original_fps = 30
+        self.grabber = FrameGrabber(
+            cap,
+            max_frames=self.max_frames,
+            loop=is_file,
+            frame_delay=1 / original_fps if is_file else 0.0
+        )
+        return cap
+
+    def run(self):
+        self.cap = self.open_video_source()
+        self.grabber.start()
+        publish_rate = RateCounter(interval=5.0)
+        print(f"Sending frames from {self.source}")
+        try:
+            while True:
+                item = self.grabber.get(timeout=0.5)
+                if item is None:
+                    if self.grabber.finished:
+                        print("Error reading frames")
+                        break
+                    continue
+                frame, timestamps = item
+
+                self.publisher.publish(frame, timestamps)
+
+                fps = publish_rate.tick()
+                if fps is not None:
+                    self.publisher.publish_fps(timestamps, fps, self.grabber)
+                    print(f"FPS: {fps:.2f} (capture {self.grabber.fps:.2f}, dropped {self.grabber.dropped})")
+        except KeyboardInterrupt:
+            print("Program terminated by user")
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+        if self.cap is not None:
+            self.cap.release()
+        self.publisher.close()
+        self.context.term()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless video sender")
+    parser.add_argument("--source", default="0",
+                        help="webcam index, video file or http(s)/rtsp URL")
+    parser.add_argument("--shm", action="store_true",
+                        help="send frames through shared memory (same-host consumers)")
+    parser.add_argument("--buffer", type=int, default=2,
+                        help="number of newest frames kept between capture and publish")
+    args = parser.parse_args()
+
+    VideoSenderService(args.source, use_shm=args.shm, max_frames=args.buffer).run()
@@ -1,63 +1,113 @@
-import pandas as pd
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.semi_supervised import LabelPropagation
-from mpl_toolkits.mplot3d import Axes3D
 from threading import Thread
 import json
+import os
+import sys
+import time
 import zmq
-from datetime import datetime
-from config import PORTS
+from config import TOPICS, TOPOLOGY
+from fall_model import FallTable, load_classifier
+from fall_state import FallStateMachine
+from timestamps import now_ns
+from tracker import TrackTable
+from zone_fusion import ZoneFusion, zone_sensitivity
+from zone_registry import ZoneRegistry
+
+# ไฟล์โมเดลที่อยู่ข้าง label.py ไม่ขึ้นกับโฟลเดอร์ที่รันโปรแกรม
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fall_model.bin')
 
 class FallDetector:
-    def __init__(self):
+    """Classifies FeatureData into fall states and publishes FallAlert.
+
+    Messages are predicted in micro-batches: after the first message arrives,
+    more are collected for up to `batch_window` seconds or `max_batch`
+    messages, then the whole batch goes through one model call.
+
+    Predictions go through one FallStateMachine per Track_ID and a FallAlert
+    is only sent when a track's state changes. The periodic repeats of an
+    unchanged state go out as FallHeartbeat on their own endpoint, so alert
+    displays never re-alert on them.
+
+    ZoneData is joined to the predictions by track and frame time (see
+    zone_fusion.py), so every alert names the zone the person is in. With a
+    zone file, zones can override the state machine options.
+
+    A missing or invalid model raises RuntimeError: without a model every
+    message would be reported as "No fall".
+    """
+
+    def __init__(self, model_path=MODEL_PATH, batch_window=0.005, max_batch=64,
+                 state_options=None, max_tracks=16, max_idle=5.0, zones_file=None):
+        self.model_path = model_path
+        self.model = None
+        # Load the model before binding anything, so a bad model fails fast
+        self.load_model()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.state_options = state_options or {}
+        self.fall_states = TrackTable(
+            lambda: {"machine": FallStateMachine(**self.state_options), "zone": None},
+            max_tracks=max_tracks, max_idle=max_idle)
+        self.zone_fusion = ZoneFusion(max_tracks=max_tracks, max_idle=max_idle)
+        self.zone_registry = None
+        self.sensitivity = {}
+        self.sensitivity_version = None
+        if zones_file:
+            self.zone_registry = ZoneRegistry(zones_file)
+            # ตรวจสอบ fall_state ของทุกโซนตั้งแต่เริ่ม ค่าที่ผิดจะหยุดโปรแกรม
+            try:
+                self.zone_sensitivity()
+            except ValueError as e:
+                raise RuntimeError(f"Invalid zone file {zones_file}: {e}") from e
+            self.zone_registry.start()
+        
         # ZeroMQ setup
         self.context = zmq.Context()
-        self.socket.bind(f"tcp://*:{PORTS['feature_data']}")
         
         # Socket for receiving Feature data from feature.py
         self.feature_socket = self.context.socket(zmq.SUB)
-        self.feature_socket.connect("tcp://localhost:5559")
-        self.feature_socket.setsockopt_string(zmq.SUBSCRIBE, "FeatureData")
+        TOPOLOGY.configure_socket(self.feature_socket, 'feature_data')
+        self.feature_socket.connect(TOPOLOGY.connect_address('feature_data'))
+        self.feature_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['feature_data'])
         self.feature_socket.setsockopt(zmq.RCVTIMEO, 100)  # 100ms timeout
         
         # Socket for sending alerts
         self.alert_socket = self.context.socket(zmq.PUB)
-        self.alert_socket.bind("tcp://*:5558")  # For sending fall alerts
+        TOPOLOGY.configure_socket(self.alert_socket, 'fall_alerts')
+        self.alert_socket.bind(TOPOLOGY.bind_address('fall_alerts'))  # For sending fall alerts
+        
+        # Socket for heartbeats (unchanged state, for liveness monitoring only)
+        self.heartbeat_socket = self.context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.heartbeat_socket, 'fall_heartbeats')
+        self.heartbeat_socket.bind(TOPOLOGY.bind_address('fall_heartbeats'))
         
         # เพิ่ม socket สำหรับรับข้อมูลโซน
         self.zone_socket = self.context.socket(zmq.SUB)
-        self.zone_socket.connect("tcp://localhost:5557")
-        self.zone_socket.setsockopt_string(zmq.SUBSCRIBE, "ZoneDetector")
+        TOPOLOGY.configure_socket(self.zone_socket, 'zone_data')
+        self.zone_socket.connect(TOPOLOGY.connect_address('zone_data'))
+        self.zone_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['zone_data'])
         
         # ใช้ Poller เพื่อจัดการหลาย socket
         self.poller = zmq.Poller()
         self.poller.register(self.feature_socket, zmq.POLLIN)
         self.poller.register(self.zone_socket, zmq.POLLIN)
         
-        # Load models and data
-        self.load_model()
-        
         # Start processing thread
         self.running = True
         self.process_thread = Thread(target=self.process_features, daemon=True)
         self.process_thread.start()
     
     def load_model(self):
-        """Load pre-trained label propagation model"""
+        """Load the label propagation model exported by 1-label_csv/train_fall_model.py"""
         try:
-            # Load your pre-trained model here
-            self.label_prop_model = LabelPropagation(
-                kernel='knn',
-                n_neighbors=9,
-                max_iter=100,
-                tol=1e-3
-            )
-            # Load your pre-trained weights or data
-            print("Model loaded successfully")
+            self.model = load_classifier(self.model_path)
+            if isinstance(self.model, FallTable):
+                print(f"Lookup table loaded successfully ({'x'.join(map(str, self.model.labels.shape))} cells)")
+            else:
+                print(f"Model loaded successfully ({len(self.model.points)} reference points)")
         except Exception as e:
-            print(f"Error loading model: {e}")
+            raise RuntimeError(f"Error loading model {self.model_path}: {e}") from e
     
     def process_features(self):
         """Continuously process incoming feature data"""
@@ -65,27 +115,48 @@ class FallDetector:
             socks = dict(self.poller.poll(100))
             if self.feature_socket in socks:
                 try:
-                    # Receive feature data
-                    topic = self.feature_socket.recv_string()
-                    data_json = self.feature_socket.recv_string()
-                    feature_data = json.loads(data_json)
+                    # Receive a batch of feature data
+                    batch = self.receive_batch()
                     
-                    # Detect fall state
-                    fall_state = self.detect_fall(feature_data)
+                    # Detect fall states for the whole batch at once
+                    fall_states = self.detect_falls(batch)
                     
-                    # Send alert
-                    self.send_alert(fall_state)
+                    # Send alerts only when a track's state changes (or as a heartbeat)
+                    for feature_data, fall_state in zip(batch, fall_states):
+                        self.update_state(feature_data, fall_state)
                     
-                except zmq.Again:
-                    continue
                 except Exception as e:
                     print(f"Error processing features: {e}")
                     continue
                 
             if self.zone_socket in socks:
-                topic = self.zone_socket.recv_string()
+                self.receive_zones()
+    
+    def receive_zones(self):
+        """รับ ZoneData ที่รออยู่ทั้งหมดเข้า ZoneFusion"""
+        while True:
+            try:
+                topic = self.zone_socket.recv_string(flags=zmq.NOBLOCK)
                 zone_data = json.loads(self.zone_socket.recv_string())
-                self.current_zones = zone_data  # บันทึกข้อมูลโซนล่าสุด
+            except zmq.Again:
+                return
+            self.zone_fusion.add(zone_data)
+    
+    def receive_batch(self):
+        """FeatureData messages that arrived within batch_window of the first one"""
+        batch = []
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                topic = self.feature_socket.recv_string(flags=zmq.NOBLOCK)
+                batch.append(json.loads(self.feature_socket.recv_string()))
+                continue
+            except zmq.Again:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.feature_socket.poll(remaining * 1000):
+                break
+        return batch
     
     def detect_fall(self, features):
         """
@@ -95,30 +166,90 @@ class FallDetector:
             1: กำลังจะล้ม (About to fall)
             2: ล้ม (Fallen)
         """
+        return self.detect_falls([features])[0]
+    
+    def detect_falls(self, feature_list):
+        """detect_fall for many FeatureData messages with one model call"""
+        if not feature_list:
+            return []
         try:
             # Prepare features (Frame_Rate, CoG_Angle, Movement_Rate)
-            features_array = np.array([[features['Frame_Rate'], 
-                                     features['CoG_Angle'], 
-                                     features['Movement_Rate']]])
+            features_array = np.array([[features['Frame_Rate'],
+                                        features['CoG_Angle'],
+                                        features['Movement_Rate']] for features in feature_list])
             
             # Predict using the model
-            prediction = self.label_prop_model.predict(features_array)[0]
-            
-            return int(prediction)
+            return [int(prediction) for prediction in self.model.predict(features_array)]
         except Exception as e:
             print(f"Error in fall detection: {e}")
-            return 0
+            return [0] * len(feature_list)
+    
+    def update_state(self, feature_data, fall_state):
+        """Feed one prediction to its track's state machine and send the alert it asks for"""
+        track_id = feature_data.get('Track_ID', 0)
+        monotonic_ns = feature_data.get('Feature_Monotonic_ns') or now_ns()[1]
+        self.fall_states.evict_idle(monotonic_ns)
+        track = self.fall_states.get(track_id, monotonic_ns)
+        
+        # โซนที่คนนี้อยู่ในภาพเดียวกัน และความไวของโซนนั้น
+        zones = self.zone_fusion.zone_for(track_id, monotonic_ns)
+        zone = self.select_zone(zones)
+        if zone != track["zone"]:
+            track["zone"] = zone
+            track["machine"].configure(**{**self.state_options, **self.zone_options(zone)})
+        
+        update = track["machine"].update(fall_state, monotonic_ns)
+        if update is not None:
+            state, reason = update
+            self.send_alert(state, zone=zone, track_id=track_id, reason=reason)
     
-    def send_alert(self, fall_state, zone=None):
+    def select_zone(self, zones):
+        """Zone reported for a person in several zones: the first with its own sensitivity"""
+        if not zones:
+            return None
+        sensitivity = self.zone_sensitivity()
+        return next((name for name in zones if name in sensitivity), zones[0])
+    
+    def zone_sensitivity(self):
+        """Per-zone FallStateMachine options of the current zone file version"""
+        if self.zone_registry is None:
+            return self.sensitivity
+        compiled = self.zone_registry.current
+        if compiled.version != self.sensitivity_version:
+            try:
+                sensitivity = zone_sensitivity(compiled.zones)
+            except ValueError as e:
+                if self.sensitivity_version is None:
+                    raise
+                # ไฟล์ที่แก้ระหว่างทำงานผิด ใช้ค่าเดิมต่อ (เหมือน ZoneRegistry)
+                sensitivity = self.sensitivity
+                print(f"Error in zone sensitivity, keeping previous values: {e}")
+            self.sensitivity = sensitivity
+            self.sensitivity_version = compiled.version
+        return self.sensitivity
+    
+    def zone_options(self, zone):
+        return self.zone_sensitivity().get(zone, {}) if zone is not None else {}
+    
+    def send_alert(self, fall_state, zone=None, track_id=0, reason="transition"):
         """Send alert through ZMQ"""
+        timestamp_ns, monotonic_ns = now_ns()
         alert_data = {
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+            'timestamp_ns': timestamp_ns,
+            'monotonic_ns': monotonic_ns,
+            'track_id': track_id,
             'state': fall_state,
+            'reason': reason,
             'zone': zone,
             'state_description': self.get_state_description(fall_state)
         }
         
-        self.alert_socket.send_string("FallAlert", zmq.SNDMORE)
+        if reason == "heartbeat":
+            self.heartbeat_socket.send_string(TOPICS['fall_heartbeats'], zmq.SNDMORE)
+            self.heartbeat_socket.send_string(json.dumps(alert_data))
+            return
+        
+        self.alert_socket.send_string(TOPICS['fall_alerts'], zmq.SNDMORE)
         self.alert_socket.send_string(json.dumps(alert_data))
         
         print(f"Alert sent: {alert_data}")
@@ -134,21 +265,49 @@ class FallDetector:
     def stop(self):
         """Clean up resources"""
         self.running = False
+        if self.zone_registry is not None:
+            self.zone_registry.stop()
+        if hasattr(self, 'zone_socket'):
+            self.zone_socket.close()
         if hasattr(self, 'feature_socket'):
             self.feature_socket.close()
         if hasattr(self, 'alert_socket'):
             self.alert_socket.close()
+        if hasattr(self, 'heartbeat_socket'):
+            self.heartbeat_socket.close()
         if hasattr(self, 'context'):
             self.context.term()
 
 if __name__ == "__main__":
-    detector = FallDetector()
+    parser = argparse.ArgumentParser(description="Fall detection from FeatureData")
+    parser.add_argument("--model", default=MODEL_PATH,
+                        help="model or lookup table file from 1-label_csv/train_fall_model.py")
+    parser.add_argument("--window", type=int, default=15,
+                        help="predictions in the majority vote of each track")
+    parser.add_argument("--fallen-run", type=int, default=5,
+                        help="consecutive Fallen predictions needed to report Fallen")
+    parser.add_argument("--debounce", type=float, default=1.0,
+                        help="seconds a reported state is held before it may change")
+    parser.add_argument("--heartbeat", type=float, default=5.0,
+                        help="seconds between repeated alerts of an unchanged state")
+    parser.add_argument("--zones", default=None,
+                        help="zone file with optional per-zone \"fall_state\" sensitivity")
+    args = parser.parse_args()
+
+    try:
+        detector = FallDetector(args.model, state_options={
+            'window': args.window,
+            'fallen_run': args.fallen_run,
+            'debounce': args.debounce,
+            'heartbeat': args.heartbeat
+        }, zones_file=args.zones)
+    except RuntimeError as e:
+        sys.exit(str(e))
     
     try:
         while True:
             # Main thread can do other work here
             # Or just sleep to keep the program running
-            import time
             time.sleep(1)
     except KeyboardInterrupt:
         detector.stop()
@@ -4,6 +4,7 @@ import time
 from threading import Thread
 import tkinter as tk
 from tkinter import ttk, messagebox
+from topology import load_topology
 
 class ScriptController:
     def __init__(self):
@@ -22,6 +23,12 @@ class ScriptController:
             return False
             
         if not self.scripts[script_name]['running']:
+            # ตรวจสอบ topology.json (พอร์ตชนกัน) ก่อนเริ่มโปรแกรม
+            try:
+                load_topology()
+            except Exception as e:
+                messagebox.showerror("Error", f"Cannot start {script_name}: {str(e)}")
+                return False
             try:
                 # Special handling for notification-for-window.py which might need Pythonw
                 if script_name == 'notification-for-window.py':
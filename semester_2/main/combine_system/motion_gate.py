@@ -0,0 +1,70 @@
+"""Skip pose inference while the scene does not change.
+
+MotionGate compares a small blurred grayscale copy of each frame with the
+copy taken the last time inference ran. While too few pixels differ, the
+caller re-sends its last PoseData through reuse_pose() instead of running
+MediaPipe. A refresh is forced every `refresh_interval` seconds so slow
+changes (lighting, a person shifting very slowly) are still picked up.
+"""
+import cv2
+
+from timestamps import now_ns
+
+
+class MotionGate:
+    def __init__(self, threshold=0.01, pixel_delta=15, width=160, refresh_interval=5.0):
+        self.threshold = threshold        # fraction of pixels that must change
+        self.pixel_delta = pixel_delta    # grey-level difference that counts as a change
+        self.width = width
+        self.refresh_interval_ns = int(refresh_interval * 1e9)
+        self.reference = None
+        self.reference_ns = None
+        self.skipped = 0
+
+    def small_gray(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.width / width)
+        small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+    def changed(self, frame, monotonic_ns):
+        """True when inference should run for this frame (it then becomes the reference)"""
+        return self.changed_gray(self.small_gray(frame), monotonic_ns)
+
+    def changed_gray(self, gray, monotonic_ns):
+        """changed() for a frame already reduced by small_gray().
+
+        Callers reading a shared-memory view take small_gray() (a copy), check
+        the slot is still current, and only then compare with this.
+        """
+        if (self.reference is None or self.reference.shape != gray.shape or
+                monotonic_ns - self.reference_ns >= self.refresh_interval_ns):
+            return self.set_reference(gray, monotonic_ns)
+
+        moving = cv2.countNonZero(cv2.threshold(
+            cv2.absdiff(gray, self.reference), self.pixel_delta, 255, cv2.THRESH_BINARY)[1])
+        if moving > self.threshold * gray.size:
+            return self.set_reference(gray, monotonic_ns)
+
+        self.skipped += 1
+        return False
+
+    def set_reference(self, gray, monotonic_ns):
+        self.reference = gray
+        self.reference_ns = monotonic_ns
+        return True
+
+
+def reuse_pose(pose_info, image_timestamp_ns, image_monotonic_ns):
+    """Copy of a cached PoseData for a new, unchanged frame, flagged with Reused"""
+    pose_timestamp_ns, pose_monotonic_ns = now_ns()
+    reused = dict(pose_info)
+    reused.update({
+        "Image_Timestamp_ns": image_timestamp_ns,
+        "Image_Monotonic_ns": image_monotonic_ns,
+        "Pose_Timestamp_ns": pose_timestamp_ns,
+        "Pose_Monotonic_ns": pose_monotonic_ns,
+        "Reused": True
+    })
+    return reused
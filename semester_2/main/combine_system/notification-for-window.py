@@ -5,8 +5,9 @@ from tkinter import ttk, messagebox
 from PIL import Image, ImageTk
 import cv2
 import numpy as np
-from datetime import datetime
 import base64
+from config import TOPICS, TOPOLOGY
+from timestamps import format_timestamp
 
 class FallNotificationApp:
     def __init__(self, root):
@@ -19,23 +20,27 @@ class FallNotificationApp:
         # Setup ZMQ
         self.context = zmq.Context()
         self.alert_socket = self.context.socket(zmq.SUB)
-        self.alert_socket.connect("tcp://localhost:5560")
-        self.alert_socket.setsockopt_string(zmq.SUBSCRIBE, "FallAlert")
+        TOPOLOGY.configure_socket(self.alert_socket, 'fall_alerts')
+        self.alert_socket.connect(TOPOLOGY.connect_address('fall_alerts'))
+        self.alert_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['fall_alerts'])
         
         # Setup image socket
         self.image_socket = self.context.socket(zmq.SUB)
-        self.image_socket.connect("tcp://localhost:5561")
-        self.image_socket.setsockopt_string(zmq.SUBSCRIBE, "Sender_frame")
+        TOPOLOGY.configure_socket(self.image_socket, 'annotated_images')
+        self.image_socket.connect(TOPOLOGY.connect_address('annotated_images'))
+        self.image_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['annotated_images'])
         
         # Setup graph image socket
         self.graph_socket = self.context.socket(zmq.SUB)
-        self.graph_socket.connect("tcp://localhost:5558")
-        self.graph_socket.setsockopt_string(zmq.SUBSCRIBE, "GraphImage")
+        TOPOLOGY.configure_socket(self.graph_socket, 'graph_data')
+        self.graph_socket.connect(TOPOLOGY.connect_address('graph_data'))
+        self.graph_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['graph_data'])
         
         # เพิ่ม socket สำหรับรับข้อมูลโซน
         self.zone_socket = self.context.socket(zmq.SUB)
-        self.zone_socket.connect("tcp://localhost:5557")
-        self.zone_socket.setsockopt_string(zmq.SUBSCRIBE, "ZoneData")
+        TOPOLOGY.configure_socket(self.zone_socket, 'zone_data')
+        self.zone_socket.connect(TOPOLOGY.connect_address('zone_data'))
+        self.zone_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['zone_data'])
         
         # ใช้ Poller
         self.poller = zmq.Poller()
@@ -229,7 +234,7 @@ class FallNotificationApp:
                 )
             
             self.zone_label.config(text=f"Zone: {zone}")
-            self.timestamp_label.config(text=f"Time: {self.current_alert['timestamp']}")
+            self.timestamp_label.config(text=f"Time: {format_timestamp(self.current_alert['timestamp_ns'])}")
     
     def update_image_display(self):
         if self.zone_image is not None:
@@ -1,14 +1,17 @@
 import cv2
 import zmq
-import base64
 import json
-import numpy as np
+import time
 import mediapipe as mp
-from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
 from threading import Thread, Event
 from PIL import Image, ImageTk
+from frame_codec import recv_frame, recv_latest_frame, decode_frame, attach_ring, frame_is_current
+from config import FRAME_RING, TOPICS, TOPOLOGY
+from pose_estimator import PoseEstimator, MultiPoseEstimator, QualityController
+from tracker import IoUTracker
+from motion_gate import MotionGate, reuse_pose
 
 
 class PoseDetectionApp:
@@ -17,6 +20,16 @@ class PoseDetectionApp:
         self.running = False
         self.show_video = True
         self.stop_event = Event()
+        self.frame_ring = None
+        self.realtime = True
+        self.skipped_frames = 0
+        self.multi_person = False
+        self.multi_estimator = None
+        self.tracker = None
+        self.quality = None
+        self.motion_gate = None
+        self.last_pose = None  # PoseData (or list in multi-person mode) from the last inference
+        self.frame_budget = 1 / 30  # seconds per frame for "Auto quality"
 
         
         self.setup_ui()
@@ -61,28 +74,60 @@ class PoseDetectionApp:
         self.video_toggle = ttk.Checkbutton(btn_frame, text="Show Video", command=self.toggle_video, variable=tk.BooleanVar(value=True))
         self.video_toggle.pack(side=tk.LEFT, padx=5)
         
+        # Realtime mode: always process the newest frame and drop the backlog
+        self.realtime_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(btn_frame, text="Realtime (latest frame only)", variable=self.realtime_var).pack(side=tk.LEFT, padx=5)
+        
+        # Multi-person mode: one pose and Track_ID per person in view
+        self.multi_person_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_frame, text="Multi-person", variable=self.multi_person_var).pack(side=tk.LEFT, padx=5)
+        
+        # ROI mode: run pose only around the person found in the previous frame
+        self.roi_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_frame, text="ROI crop", variable=self.roi_var).pack(side=tk.LEFT, padx=5)
+        
+        # Auto quality: lower model complexity / resolution when frames take too long
+        self.auto_quality_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_frame, text="Auto quality", variable=self.auto_quality_var).pack(side=tk.LEFT, padx=5)
+        
+        # Motion gate: skip inference and repeat the last pose while the scene is static
+        self.motion_gate_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_frame, text="Motion gate", variable=self.motion_gate_var).pack(side=tk.LEFT, padx=5)
+        
         ttk.Button(btn_frame, text="Exit", command=self.on_close).pack(side=tk.RIGHT, padx=5)
         
     def setup_zmq(self):
         self.context = zmq.Context()
         self.receiver_socket = self.context.socket(zmq.SUB)
-        self.receiver_socket.connect("tcp://localhost:5555")
-        self.receiver_socket.setsockopt_string(zmq.SUBSCRIBE, 'Sender_frame')
+        TOPOLOGY.configure_socket(self.receiver_socket, 'frames')
+        self.receiver_socket.connect(TOPOLOGY.connect_address('frames'))
+        self.receiver_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['frames'])
 
         self.sender_socket = self.context.socket(zmq.PUB)
-        self.sender_socket.bind("tcp://*:5556")
+        TOPOLOGY.configure_socket(self.sender_socket, 'pose_data')
+        self.sender_socket.bind(TOPOLOGY.bind_address('pose_data'))
         
     def setup_mediapipe(self):
+        self.estimator = PoseEstimator(min_detection_confidence=0.5, min_tracking_confidence=0.5)
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False, 
-            min_detection_confidence=0.5, 
-            min_tracking_confidence=0.5
-        )
         self.mp_drawing = mp.solutions.drawing_utils
         
     def start_detection(self):
         if not self.running:
+            self.realtime = self.realtime_var.get()
+            self.multi_person = self.multi_person_var.get()
+            if self.multi_person and self.multi_estimator is None:
+                self.multi_estimator = MultiPoseEstimator()
+            self.tracker = IoUTracker() if self.multi_person else None
+            self.estimator.roi_margin = 0.5 if self.roi_var.get() else None
+            self.estimator.roi = None
+            self.motion_gate = MotionGate() if self.motion_gate_var.get() else None
+            self.last_pose = None
+            if self.auto_quality_var.get():
+                self.quality = QualityController(self.estimator, self.frame_budget)
+            else:
+                self.quality = None
+                self.estimator.configure(1, None)
             self.running = True
             self.stop_event.clear()
             self.start_btn.config(state=tk.DISABLED)
@@ -104,64 +149,85 @@ class PoseDetectionApp:
         if not self.show_video:
             self.video_label.config(image='')
             
+    def get_frame_ring(self, header, payload):
+        """Attach to the sender's shared-memory ring, again whenever the sender recreated it"""
+        self.frame_ring = attach_ring(self.frame_ring, header, payload, FRAME_RING['name'])
+        return self.frame_ring
+        
     def process_frames(self):
+        self.skipped_frames = 0
+        last_status_time = time.time()
         while not self.stop_event.is_set():
             try:
                 # Receive frame from ZeroMQ
-                topic = self.receiver_socket.recv_string()
-                data_json = self.receiver_socket.recv_string()
-                data = json.loads(data_json)
-
-                # Extract timestamp and frame
-                image_timestamp = data["timestamp"]
-                jpg_as_text = data["frame"]
-                
-                # Convert frame from base64 back to image
-                jpg_original = base64.b64decode(jpg_as_text)
-                frame = cv2.imdecode(np.frombuffer(jpg_original, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if self.realtime:
+                    header, payload, skipped = recv_latest_frame(self.receiver_socket)
+                    self.skipped_frames += skipped
+                else:
+                    header, payload = recv_frame(self.receiver_socket)
 
-                # Convert frame to RGB (Mediapipe requires RGB format)
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                if time.time() - last_status_time >= 1.0:
+                    status = f"Running - Processing frames... (skipped {self.skipped_frames})"
+                    if self.quality is not None and not self.multi_person:
+                        status += f" [{self.quality.describe()}]"
+                    if self.motion_gate is not None:
+                        status += f" (static {self.motion_gate.skipped})"
+                    self.status_var.set(status)
+                    last_status_time = time.time()
 
-                # Process frame with Mediapipe Pose
-                results = self.pose.process(rgb_frame)
+                frame = decode_frame(header, payload, self.get_frame_ring(header, payload))
+                if frame is None:
+                    self.skipped_frames += 1  # Shared-memory slot already reused by the sender
+                    continue
 
-                # Draw skeleton on frame (if landmarks exist)
-                if results.pose_landmarks:
-                    self.mp_drawing.draw_landmarks(
-                        frame, results.pose_landmarks, self.mp_pose.POSE_CONNECTIONS)
+                if self.motion_gate is not None:
+                    # Gate on a small copy, and only if the slot was not overwritten while copying
+                    gray = self.motion_gate.small_gray(frame)
+                    if not frame_is_current(self.frame_ring, header, payload):
+                        self.skipped_frames += 1
+                        continue
+                if self.motion_gate is not None and not self.motion_gate.changed_gray(gray, header.monotonic_ns):
+                    self.publish_reused(header)
+                    if self.show_video:
+                        self.display_frame(frame)
+                    continue
 
-                    # Get coordinates of all 33 landmarks
-                    landmarks = results.pose_landmarks.landmark
-                    height, width, _ = frame.shape
+                estimator = self.multi_estimator if self.multi_person else self.estimator
 
-                    # Create list to store (x, y) coordinates
-                    pose_data = []
-                    for landmark in landmarks:
-                        pose_data.extend([landmark.x, landmark.y])
+                # Convert frame to RGB (Mediapipe requires RGB format)
+                start = time.monotonic()
+                rgb_frame = estimator.prepare(frame)
 
-                    # Calculate frame dimensions
-                    max_width = width
-                    max_height = height
+                # The RGB copy is only valid if the sender did not overwrite the slot meanwhile
+                if not frame_is_current(self.frame_ring, header, payload):
+                    self.skipped_frames += 1
+                    continue
 
-                    # Add Pose_Timestamp
-                    pose_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+                if self.multi_person:
+                    frame = self.process_people(frame, rgb_frame, header)
+                    if self.show_video:
+                        self.display_frame(frame)
+                    continue
 
-                    # Create data to send
-                    pose_info = {
-                        "Image_Timestamp": image_timestamp,
-                        "Pose_Timestamp": pose_timestamp,
-                        "MAX_Height": max_height,
-                        "MAX_Width": max_width,
-                        "Landmarks": pose_data
-                    }
+                # Process frame with Mediapipe Pose
+                pose_info, results = self.estimator.infer(rgb_frame, header.timestamp_ns, header.monotonic_ns)
+                self.last_pose = pose_info
+                if self.quality is not None:
+                    self.quality.observe(time.monotonic() - start)
 
-                    # Convert data to JSON
-                    pose_info_json = json.dumps(pose_info)
+                if pose_info is not None:
+                    # Draw skeleton on frame
+                    if self.show_video:
+                        if not frame.flags.writeable:
+                            frame = frame.copy()  # Never draw into the shared ring
+                        # Landmarks are relative to the region given to MediaPipe
+                        x_min, y_min, x_max, y_max = self.estimator.region
+                        self.mp_drawing.draw_landmarks(
+                            frame[y_min:y_max, x_min:x_max], results.pose_landmarks, self.mp_pose.POSE_CONNECTIONS)
 
                     # Send data to PoseData topic
-                    self.sender_socket.send_string("PoseData", zmq.SNDMORE)
-                    self.sender_socket.send_string(pose_info_json)
+                    self.sender_socket.send_string(TOPICS['pose_data'], zmq.SNDMORE)
+                    self.sender_socket.send_string(json.dumps(pose_info))
 
                 # Display frame if video is enabled
                 if self.show_video:
@@ -173,6 +239,39 @@ class PoseDetectionApp:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
                 break
                 
+    def process_people(self, frame, rgb_frame, header):
+        """Multi-person path: publish one tracked PoseData per person, return the frame to show"""
+        pose_infos, found = self.multi_estimator.infer(rgb_frame, header.timestamp_ns, header.monotonic_ns)
+        self.tracker.assign(pose_infos)
+        self.last_pose = pose_infos
+
+        if self.show_video and pose_infos and not frame.flags.writeable:
+            frame = frame.copy()  # Never draw into the shared ring
+        for pose_info, ((x_min, y_min, x_max, y_max), results) in zip(pose_infos, found):
+            if self.show_video:
+                # Landmarks are relative to the crop, so draw into the crop view
+                self.mp_drawing.draw_landmarks(
+                    frame[y_min:y_max, x_min:x_max], results.pose_landmarks, self.mp_pose.POSE_CONNECTIONS)
+                cv2.putText(frame, f"ID {pose_info['Track_ID']}", (x_min, max(y_min - 5, 10)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+            self.sender_socket.send_string(TOPICS['pose_data'], zmq.SNDMORE)
+            self.sender_socket.send_string(json.dumps(pose_info))
+        return frame
+        
+    def publish_reused(self, header):
+        """Re-send the last PoseData for a frame the motion gate found unchanged"""
+        if not self.last_pose:
+            return
+        last_poses = self.last_pose if self.multi_person else [self.last_pose]
+        reused = [reuse_pose(pose_info, header.timestamp_ns, header.monotonic_ns) for pose_info in last_poses]
+        if self.multi_person:
+            # Keep the tracks alive while the gate holds, so IDs are not reassigned
+            self.tracker.assign(reused)
+        for pose_info in reused:
+            self.sender_socket.send_string(TOPICS['pose_data'], zmq.SNDMORE)
+            self.sender_socket.send_string(json.dumps(pose_info))
+        
     def display_frame(self, frame):
         # Convert the image from BGR to RGB
         frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -198,10 +297,14 @@ class PoseDetectionApp:
         self.root.destroy()
         
     def cleanup(self):
-        self.pose.close()
+        self.estimator.close()
+        if self.multi_estimator is not None:
+            self.multi_estimator.close()
         self.receiver_socket.close()
         self.sender_socket.close()
         self.context.term()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
@@ -0,0 +1,312 @@
+import cv2
+import mediapipe as mp
+import numpy as np
+from timestamps import now_ns
+from tracker import iou_matrix, landmark_bbox
+
+
+class PoseEstimator:
+    """MediaPipe Pose wrapper that turns BGR frames into PoseData messages.
+
+    Usage is split in two steps so callers reading from shared memory can check
+    that the source slot was not overwritten before running inference:
+
+        rgb = estimator.prepare(frame)
+        pose_info, results = estimator.infer(rgb, header.timestamp_ns, header.monotonic_ns)
+
+    With `roi_margin` set, only a region around the last landmarks is
+    converted and given to MediaPipe: the landmark box grown by roi_margin
+    times its size on every side. The region is kept while the person stays
+    well inside it, so MediaPipe's own frame-to-frame tracking stays valid,
+    and it is dropped (full frame again) when the pose is lost. `region` is
+    the (x_min, y_min, x_max, y_max) pixel area used by the last prepare();
+    `results` landmarks are relative to it, PoseData landmarks are always
+    full-frame normalized.
+
+    `max_width` scales the (region of the) frame down before conversion, and
+    `model_complexity` / `smooth_landmarks` are passed to MediaPipe Pose.
+    configure() changes complexity and width while running (QualityController).
+    """
+
+    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5, roi_margin=None,
+                 model_complexity=1, smooth_landmarks=True, max_width=None):
+        self.mp_pose = mp.solutions.pose
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.smooth_landmarks = smooth_landmarks
+        self.model_complexity = model_complexity
+        self.max_width = max_width
+        self.pose = self.create_pose()
+        self.frame_width = 0
+        self.frame_height = 0
+        self.roi_margin = roi_margin
+        self.roi = None      # region for the next frame, None = full frame
+        self.region = None   # region used by the last prepare()
+
+    def create_pose(self):
+        return self.mp_pose.Pose(
+            static_image_mode=False,
+            model_complexity=self.model_complexity,
+            smooth_landmarks=self.smooth_landmarks,
+            min_detection_confidence=self.min_detection_confidence,
+            min_tracking_confidence=self.min_tracking_confidence
+        )
+
+    def configure(self, model_complexity, max_width):
+        """Switch model complexity (rebuilds the MediaPipe graph) and input width"""
+        self.max_width = max_width
+        if model_complexity != self.model_complexity:
+            self.model_complexity = model_complexity
+            self.pose.close()
+            self.pose = self.create_pose()
+
+    def prepare(self, frame):
+        """Convert a BGR frame (or its ROI) to the RGB image MediaPipe expects (always a new array)"""
+        height, width = frame.shape[:2]
+        if (width, height) != (self.frame_width, self.frame_height):
+            self.roi = None  # resolution changed
+        self.frame_height, self.frame_width = height, width
+
+        self.region = self.roi or (0, 0, width, height)
+        x_min, y_min, x_max, y_max = self.region
+        image = frame[y_min:y_max, x_min:x_max]
+        # Landmarks are normalized, so downscaling does not change their meaning
+        if self.max_width and x_max - x_min > self.max_width:
+            scale = self.max_width / (x_max - x_min)
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def update_roi(self, landmarks):
+        """Choose the region for the next frame from this frame's full-frame landmarks"""
+        if landmarks is None:
+            self.roi = None  # tracking lost: search the whole frame again
+            return
+        size = np.array([self.frame_width, self.frame_height], dtype=float)
+        box = landmark_bbox(landmarks) * np.tile(size, 2)
+        extent = box[2:] - box[:2]
+
+        if self.roi is not None:
+            # Keep the current region while the person is not close to its border
+            inner = np.array(self.roi, dtype=float) + np.concatenate([extent, -extent]) * self.roi_margin / 2
+            if (box[:2] >= inner[:2]).all() and (box[2:] <= inner[2:]).all():
+                return
+
+        margin = extent * self.roi_margin
+        x_min, y_min = np.clip(box[:2] - margin, 0, size).astype(int)
+        x_max, y_max = np.clip(box[2:] + margin, 0, size).astype(int)
+        if (x_max - x_min) * (y_max - y_min) > 0.6 * self.frame_width * self.frame_height:
+            self.roi = None  # almost the whole frame anyway
+        else:
+            self.roi = (int(x_min), int(y_min), int(x_max), int(y_max))
+
+    def infer(self, rgb_frame, image_timestamp_ns, image_monotonic_ns):
+        """Run pose inference on a frame captured at the given wall-clock/monotonic ns.
+
+        Returns (pose_info or None, MediaPipe results).
+        """
+        results = self.pose.process(rgb_frame)
+        if not results.pose_landmarks:
+            if self.roi_margin is not None:
+                self.update_roi(None)
+            return None, results
+
+        # Create list to store (x, y) coordinates of all 33 landmarks,
+        # mapped from the region back to the full frame
+        x_min, y_min, x_max, y_max = self.region
+        pose_data = []
+        for landmark in results.pose_landmarks.landmark:
+            pose_data.extend([
+                (x_min + landmark.x * (x_max - x_min)) / self.frame_width,
+                (y_min + landmark.y * (y_max - y_min)) / self.frame_height
+            ])
+        if self.roi_margin is not None:
+            self.update_roi(pose_data)
+
+        pose_info = make_pose_info(pose_data, image_timestamp_ns, image_monotonic_ns,
+                                   self.frame_width, self.frame_height)
+        return pose_info, results
+
+    def close(self):
+        self.pose.close()
+
+
+class QualityController:
+    """Keeps a PoseEstimator's per-frame time under `budget` seconds.
+
+    LEVELS go from best to cheapest as (model_complexity, max_width). The
+    average frame time (exponential moving average) is compared with the
+    budget: above it the estimator steps one level down, below
+    `headroom * budget` it steps one level up. Changes are held for
+    `hold_frames` frames (three times as long before stepping up again) so a
+    switch is measured before the next one.
+
+    The controller starts at the estimator's own configuration. If that is not
+    one of LEVELS (for example complexity 0 at full width), it is added to
+    this controller's ladder just before the next cheaper level, so the
+    input is only shrunk when the budget requires it.
+    """
+
+    LEVELS = [(2, None), (1, None), (1, 960), (1, 640), (0, 640), (0, 480), (0, 320)]
+
+    def __init__(self, estimator, budget, headroom=0.6, smoothing=0.1, hold_frames=30):
+        self.estimator = estimator
+        self.budget = budget
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.hold_frames = hold_frames
+        self.average = None
+        self.frames_since_change = 0
+        self.levels = list(self.LEVELS)
+        start = (estimator.model_complexity, estimator.max_width)
+        self.level = self.closest_level(*start)
+        if self.levels[self.level:self.level + 1] != [start]:
+            self.levels.insert(self.level, start)
+        self.apply()
+
+    def closest_level(self, model_complexity, max_width):
+        """Index of the first level that is no more expensive than this configuration"""
+        for i, (complexity, width) in enumerate(self.levels):
+            fits = max_width is None or (width is not None and width <= max_width)
+            if complexity <= model_complexity and fits:
+                return i
+        return len(self.levels)
+
+    def apply(self):
+        self.estimator.configure(*self.levels[self.level])
+
+    def describe(self):
+        complexity, width = self.levels[self.level]
+        return f"complexity {complexity}, {'full' if width is None else width}px"
+
+    def observe(self, seconds):
+        """Record one frame's processing time. Returns True when the level changed"""
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += self.smoothing * (seconds - self.average)
+        self.frames_since_change += 1
+        if self.frames_since_change < self.hold_frames:
+            return False
+
+        if self.average > self.budget and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif (self.average < self.budget * self.headroom and self.level > 0 and
+              self.frames_since_change >= self.hold_frames * 3):
+            self.level -= 1
+        else:
+            return False
+
+        self.apply()
+        self.average = None
+        self.frames_since_change = 0
+        return True
+
+
+def make_pose_info(landmarks, image_timestamp_ns, image_monotonic_ns, width, height, track_id=0):
+    """PoseData message for one person; single-person estimation always uses track 0"""
+    pose_timestamp_ns, pose_monotonic_ns = now_ns()
+    return {
+        "Image_Timestamp_ns": image_timestamp_ns,
+        "Image_Monotonic_ns": image_monotonic_ns,
+        "Pose_Timestamp_ns": pose_timestamp_ns,
+        "Pose_Monotonic_ns": pose_monotonic_ns,
+        "MAX_Height": height,
+        "MAX_Width": width,
+        "Track_ID": track_id,
+        "Reused": False,  # True when motion_gate.reuse_pose repeated an earlier result
+        "Landmarks": landmarks
+    }
+
+
+class MultiPoseEstimator:
+    """Pose for several people: person boxes first, then MediaPipe Pose per box.
+
+    Person boxes come from OpenCV's HOG people detector, run on a copy scaled
+    to `detect_width`. HOG only finds upright people, so the landmark boxes
+    of the previous call are used as regions too: someone who has fallen
+    keeps being estimated as long as their pose is found. Landmarks are
+    mapped back to full-frame normalized coordinates, so PoseData looks the
+    same as in single-person mode. Track_ID is left for IoUTracker to set.
+
+        rgb = estimator.prepare(frame)
+        pose_infos, regions = estimator.infer(rgb, header.timestamp_ns, header.monotonic_ns)
+    """
+
+    def __init__(self, max_people=4, padding=0.15, detect_width=640, min_detection_confidence=0.5):
+        self.max_people = max_people
+        self.padding = padding
+        self.detect_width = detect_width
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        # Crops belong to different people on every call, so no tracking between calls
+        self.pose = mp.solutions.pose.Pose(
+            static_image_mode=True,
+            min_detection_confidence=min_detection_confidence
+        )
+        self.previous_boxes = np.zeros((0, 4))  # pixel boxes of the last poses found
+        self.frame_width = 0
+        self.frame_height = 0
+
+    def prepare(self, frame):
+        """Convert a BGR frame to the RGB image MediaPipe expects (always a new array)"""
+        self.frame_height, self.frame_width = frame.shape[:2]
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def detect_people(self, rgb_frame):
+        """Pixel boxes (x_min, y_min, x_max, y_max) of people found by HOG"""
+        scale = min(1.0, self.detect_width / self.frame_width)
+        small = cv2.resize(rgb_frame, None, fx=scale, fy=scale) if scale < 1.0 else rgb_frame
+        rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8))
+        if len(rects) == 0:
+            return np.zeros((0, 4))
+        order = np.argsort(-np.asarray(weights).ravel())[:self.max_people]
+        rects = np.asarray(rects, dtype=float)[order] / scale
+        return np.column_stack([rects[:, :2], rects[:, :2] + rects[:, 2:]])
+
+    def regions(self, rgb_frame):
+        """Previous landmark boxes plus new detections that do not overlap them"""
+        detections = self.detect_people(rgb_frame)
+        boxes = self.previous_boxes
+        if len(detections):
+            if len(boxes):
+                detections = detections[iou_matrix(detections, boxes).max(axis=1) < 0.3]
+            boxes = np.concatenate([boxes, detections])
+        return boxes[:self.max_people]
+
+    def infer(self, rgb_frame, image_timestamp_ns, image_monotonic_ns):
+        """Returns (list of pose_info, list of (pixel region, MediaPipe results)) for the people found"""
+        size = np.array([self.frame_width, self.frame_height], dtype=float)
+        pose_infos, found = [], []
+        for box in self.regions(rgb_frame):
+            # Pad the box so arms and feet outside the detection are not cut off
+            margin = (box[2:] - box[:2]) * self.padding
+            x_min, y_min = np.clip(box[:2] - margin, 0, size).astype(int)
+            x_max, y_max = np.clip(box[2:] + margin, 0, size).astype(int)
+            if x_max - x_min < 16 or y_max - y_min < 16:
+                continue
+
+            results = self.pose.process(rgb_frame[y_min:y_max, x_min:x_max])
+            if not results.pose_landmarks:
+                continue
+
+            pose_data = []
+            for landmark in results.pose_landmarks.landmark:
+                pose_data.extend([
+                    (x_min + landmark.x * (x_max - x_min)) / self.frame_width,
+                    (y_min + landmark.y * (y_max - y_min)) / self.frame_height
+                ])
+            # Two overlapping regions can find the same person
+            bbox = landmark_bbox(pose_data)
+            if pose_infos and iou_matrix([bbox], [landmark_bbox(info["Landmarks"]) for info in pose_infos]).max() > 0.5:
+                continue
+            pose_infos.append(make_pose_info(pose_data, image_timestamp_ns, image_monotonic_ns,
+                                             self.frame_width, self.frame_height, track_id=None))
+            found.append(((x_min, y_min, x_max, y_max), results))
+
+        self.previous_boxes = np.array(
+            [landmark_bbox(info["Landmarks"]) * np.tile(size, 2) for info in pose_infos]
+        ).reshape(-1, 4)
+        return pose_infos, found
+
+    def close(self):
+        self.pose.close()
@@ -0,0 +1,317 @@
+"""Headless pose service with a pool of MediaPipe worker processes.
+
+The main process subscribes to Sender_frame, hands each frame to the next idle
+worker (PUSH/PULL) and publishes the workers' PoseData results in the order
+the frames arrived, so FeatureCalculator still sees ordered frames.
+
+    python pose_service.py --workers 4
+    python pose_service.py --workers 4 --multi-person
+    python pose_service.py --workers 2 --roi-margin 0.5
+    python pose_service.py --workers 1 --max-width 960 --frame-budget-ms 40
+    python pose_service.py --workers 1 --motion-gate
+
+With --multi-person the workers estimate every person they find
+(MultiPoseEstimator) and the main process gives each one a Track_ID with an
+IoUTracker before publishing one PoseData message per person. Tracking runs
+on the reordered stream, so it sees the frames in capture order.
+"""
+import argparse
+import json
+import os
+import struct
+import time
+from collections import deque
+from multiprocessing import Process
+
+import zmq
+
+from config import FRAME_RING, TOPICS, TOPOLOGY
+from frame_codec import FRAME_TOPIC, decode_header, decode_frame, attach_ring, frame_is_current, CODEC_SHM
+from motion_gate import MotionGate, reuse_pose
+from pose_estimator import PoseEstimator, MultiPoseEstimator, QualityController
+from tracker import IoUTracker
+
+TASK_ID = struct.Struct("<Q")
+
+
+def pose_worker(task_endpoint, result_endpoint, multi_person=False, estimator_options=None, frame_budget=None,
+                motion_gate=False):
+    """Worker process: one MediaPipe graph, frames in, PoseData JSON (or b"") out.
+
+    In multi-person mode the JSON is a list with one PoseData per person.
+    estimator_options are PoseEstimator keyword arguments; with frame_budget
+    (seconds) a QualityController adapts the worker to it. With motion_gate,
+    frames that look like the last inferred one re-send its PoseData
+    (Reused: true) without running MediaPipe.
+    """
+    context = zmq.Context()
+    task_socket = context.socket(zmq.PULL)
+    TOPOLOGY.configure_socket(task_socket, 'pose_tasks')
+    task_socket.connect(task_endpoint)
+    result_socket = context.socket(zmq.PUSH)
+    TOPOLOGY.configure_socket(result_socket, 'pose_results')
+    result_socket.connect(result_endpoint)
+
+    if multi_person:
+        estimator = MultiPoseEstimator()
+    else:
+        estimator = PoseEstimator(**(estimator_options or {}))
+    quality = None
+    if frame_budget and not multi_person:
+        quality = QualityController(estimator, frame_budget)
+    gate = MotionGate() if motion_gate else None
+    last_pose = None  # PoseData (or list of them) from the last inference
+    frame_ring = None
+    try:
+        while True:
+            task_id, header_bytes, payload = task_socket.recv_multipart(copy=False)
+            header = decode_header(header_bytes.bytes)
+            payload = payload.buffer
+            result = b""
+
+            frame_ring = attach_ring(frame_ring, header, payload, FRAME_RING['name'])
+            frame = decode_frame(header, payload, frame_ring)
+
+            gray = None
+            if frame is not None and gate is not None:
+                # Gate on a small copy, and only if the slot was not overwritten while copying
+                gray = gate.small_gray(frame)
+                if not frame_is_current(frame_ring, header, payload):
+                    frame = None
+
+            if frame is not None and gate is not None and not gate.changed_gray(gray, header.monotonic_ns):
+                # Scene unchanged: repeat the last result for this frame's timestamps
+                if last_pose:
+                    if multi_person:
+                        reused = [reuse_pose(p, header.timestamp_ns, header.monotonic_ns) for p in last_pose]
+                    else:
+                        reused = reuse_pose(last_pose, header.timestamp_ns, header.monotonic_ns)
+                    result = json.dumps(reused).encode('utf-8')
+            elif frame is not None:
+                start = time.monotonic()
+                rgb_frame = estimator.prepare(frame)
+                if frame_is_current(frame_ring, header, payload):
+                    pose_info, _ = estimator.infer(rgb_frame, header.timestamp_ns, header.monotonic_ns)
+                    last_pose = pose_info
+                    if pose_info:
+                        result = json.dumps(pose_info).encode('utf-8')
+                    if quality is not None and quality.observe(time.monotonic() - start):
+                        print(f"Pose worker {os.getpid()}: {quality.describe()}")
+
+            # Always answer so the collector can release frames queued behind this one
+            result_socket.send_multipart([task_id.bytes, result])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        estimator.close()
+        if frame_ring is not None:
+            frame_ring.close()
+        task_socket.close()
+        result_socket.close()
+        context.term()
+
+
+class ReorderBuffer:
+    """Releases results in dispatch order.
+
+    A task that has not answered within `timeout` seconds is given up so one
+    lost frame cannot stall the stream.
+    """
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self.in_flight = deque()  # (task_id, dispatch_time) in dispatch order
+        self.results = {}
+        self.lost = 0
+
+    def __len__(self):
+        return len(self.in_flight)
+
+    def dispatched(self, task_id):
+        self.in_flight.append((task_id, time.monotonic()))
+
+    def completed(self, task_id, result):
+        # Task ids increase monotonically, so anything older than the head was given up
+        if self.in_flight and task_id >= self.in_flight[0][0]:
+            self.results[task_id] = result
+
+    def pop_ready(self):
+        """Return results that are now in order; empty results mean no pose was found"""
+        ready = []
+        now = time.monotonic()
+        while self.in_flight:
+            task_id, dispatch_time = self.in_flight[0]
+            if task_id in self.results:
+                ready.append(self.results.pop(task_id))
+            elif now - dispatch_time > self.timeout:
+                self.lost += 1
+            else:
+                break
+            self.in_flight.popleft()
+        return ready
+
+
+class PoseService:
+    def __init__(self, workers, frame_endpoint=None, max_in_flight=None, result_timeout=1.0,
+                 multi_person=False, estimator_options=None, frame_budget=None, motion_gate=False):
+        self.num_workers = workers
+        self.multi_person = multi_person
+        self.estimator_options = estimator_options or {}
+        self.frame_budget = frame_budget
+        self.motion_gate = motion_gate
+        self.tracker = IoUTracker() if multi_person else None
+        # Keep roughly one frame queued per worker; anything more only adds latency
+        self.max_in_flight = max_in_flight or workers * 2
+        # Shared-memory frames queued longer than the ring is deep are overwritten
+        # before a worker reads them, so never queue more than slots - 1 of those
+        self.shm_max_in_flight = min(self.max_in_flight, FRAME_RING['slots'] - 1)
+        self.reorder = ReorderBuffer(timeout=result_timeout)
+        self.next_task_id = 0
+        self.dropped = 0
+        self.published = 0
+        self.workers = []
+
+        self.context = zmq.Context()
+        self.frame_socket = self.context.socket(zmq.SUB)
+        TOPOLOGY.configure_socket(self.frame_socket, 'frames')
+        self.frame_socket.connect(frame_endpoint or TOPOLOGY.connect_address('frames'))
+        self.frame_socket.setsockopt(zmq.SUBSCRIBE, FRAME_TOPIC)
+
+        self.task_socket = self.context.socket(zmq.PUSH)
+        TOPOLOGY.configure_socket(self.task_socket, 'pose_tasks')
+        self.task_socket.bind(TOPOLOGY.bind_address('pose_tasks'))
+
+        self.result_socket = self.context.socket(zmq.PULL)
+        TOPOLOGY.configure_socket(self.result_socket, 'pose_results')
+        self.result_socket.bind(TOPOLOGY.bind_address('pose_results'))
+
+        self.sender_socket = self.context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.sender_socket, 'pose_data')
+        self.sender_socket.bind(TOPOLOGY.bind_address('pose_data'))
+
+        self.poller = zmq.Poller()
+        self.poller.register(self.frame_socket, zmq.POLLIN)
+        self.poller.register(self.result_socket, zmq.POLLIN)
+
+    def start_workers(self):
+        for _ in range(self.num_workers):
+            worker = Process(
+                target=pose_worker,
+                args=(TOPOLOGY.connect_address('pose_tasks'), TOPOLOGY.connect_address('pose_results'),
+                      self.multi_person, self.estimator_options, self.frame_budget, self.motion_gate),
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def dispatch(self, parts):
+        """Forward one Sender_frame message to a worker, or drop it if all are busy"""
+        shm = decode_header(parts[1].bytes).codec == CODEC_SHM
+        if len(self.reorder) >= (self.shm_max_in_flight if shm else self.max_in_flight):
+            self.dropped += 1
+            return
+        task_id = TASK_ID.pack(self.next_task_id)
+        try:
+            self.task_socket.send_multipart([task_id, parts[1], parts[2]], flags=zmq.NOBLOCK, copy=False)
+        except zmq.Again:
+            self.dropped += 1
+            return
+        self.reorder.dispatched(self.next_task_id)
+        self.next_task_id += 1
+
+    def publish_ready(self):
+        for result in self.reorder.pop_ready():
+            if not result:
+                continue
+            if self.tracker is None:
+                self.sender_socket.send_string(TOPICS['pose_data'], zmq.SNDMORE)
+                self.sender_socket.send(result)
+                self.published += 1
+                continue
+            for pose_info in self.tracker.assign(json.loads(result)):
+                self.sender_socket.send_string(TOPICS['pose_data'], zmq.SNDMORE)
+                self.sender_socket.send_string(json.dumps(pose_info))
+                self.published += 1
+
+    def run(self):
+        self.start_workers()
+        mode = "multi-person" if self.multi_person else "single person"
+        print(f"Pose service running with {self.num_workers} workers ({mode})")
+        last_report = time.time()
+        try:
+            while True:
+                socks = dict(self.poller.poll(100))
+
+                if self.result_socket in socks:
+                    while True:
+                        try:
+                            task_id, result = self.result_socket.recv_multipart(flags=zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self.reorder.completed(TASK_ID.unpack(task_id)[0], result)
+
+                if self.frame_socket in socks:
+                    while True:
+                        try:
+                            parts = self.frame_socket.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        if len(parts) == 3:
+                            self.dispatch(parts)
+
+                self.publish_ready()
+
+                if time.time() - last_report >= 5.0:
+                    print(f"PoseData: {self.published / (time.time() - last_report):.1f}/s, "
+                          f"dropped: {self.dropped}, lost: {self.reorder.lost}, in flight: {len(self.reorder)}")
+                    self.published = 0
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            print("Program terminated by user")
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        for worker in self.workers:
+            worker.terminate()
+        self.frame_socket.close()
+        self.task_socket.close()
+        self.result_socket.close()
+        self.sender_socket.close()
+        self.context.term()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-process pose detection")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="number of MediaPipe worker processes")
+    parser.add_argument("--frames", default=None,
+                        help="Sender_frame endpoint (default: frames in topology.json)")
+    parser.add_argument("--result-timeout", type=float, default=1.0,
+                        help="seconds to wait for a worker before skipping its frame")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="estimate and track every person in view")
+    parser.add_argument("--roi-margin", type=float, default=None,
+                        help="single-person mode: infer on the previous landmark box grown by this "
+                             "fraction of its size (full frame when the pose is lost)")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1,
+                        help="MediaPipe Pose model complexity")
+    parser.add_argument("--max-width", type=int, default=None,
+                        help="scale frames down to this width before inference")
+    parser.add_argument("--no-smooth", action="store_true", help="disable MediaPipe landmark smoothing")
+    parser.add_argument("--frame-budget-ms", type=float, default=None,
+                        help="lower/raise complexity and width to keep each worker's frame time under this")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="re-send the last pose instead of inferring while the scene is static")
+    args = parser.parse_args()
+
+    estimator_options = {
+        "roi_margin": args.roi_margin,
+        "model_complexity": args.model_complexity,
+        "max_width": args.max_width,
+        "smooth_landmarks": not args.no_smooth
+    }
+    frame_budget = args.frame_budget_ms / 1000 if args.frame_budget_ms else None
+    PoseService(args.workers, frame_endpoint=args.frames, result_timeout=args.result_timeout,
+                multi_person=args.multi_person, estimator_options=estimator_options,
+                frame_budget=frame_budget, motion_gate=args.motion_gate).run()
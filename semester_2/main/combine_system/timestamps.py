@@ -0,0 +1,29 @@
+"""Timestamps carried by every topic.
+
+Messages carry integer nanoseconds from two clocks:
+
+- wall clock (time.time_ns): when something happened, for humans and logs
+- monotonic clock (time.monotonic_ns): for intervals and latency on one host,
+  unaffected by NTP or daylight-saving adjustments
+
+Strings are rendered only at the edges (UI, CSV) with format_timestamp.
+"""
+import time
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def now_ns():
+    """(wall-clock ns, monotonic ns) for the current instant"""
+    return time.time_ns(), time.monotonic_ns()
+
+
+def elapsed_seconds(start_ns, end_ns):
+    """Seconds between two monotonic nanosecond readings"""
+    return (end_ns - start_ns) / 1e9
+
+
+def format_timestamp(timestamp_ns):
+    """Render a wall-clock nanosecond timestamp for display or CSV"""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).strftime(TIMESTAMP_FORMAT)
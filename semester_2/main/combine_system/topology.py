@@ -0,0 +1,139 @@
+"""Pipeline topology: every endpoint's port, topic and socket options in one file.
+
+topology.json lists one entry per endpoint:
+
+    "zone_data": {"port": 5557, "topic": "ZoneData", "bind": "zone_detection.py"}
+
+- port: TCP port of camera 0
+- topic: first frame of every message (null for PUSH/PULL endpoints)
+- bind: the stage that binds it (every other stage connects)
+- host: address to connect to (default: the top-level "host")
+- hwm: send and receive high-water mark, applied by configure_socket()
+- conflate: ZMQ_CONFLATE; only valid for endpoints without a topic, because
+  conflation drops all but one frame of multipart messages
+
+Camera N uses every port plus N * camera_port_stride. The camera is chosen
+with the FALL_CAMERA environment variable and the file with FALL_TOPOLOGY,
+so several pipelines can run on one host. config.py loads the topology, and
+every stage gets its ports and topics from there.
+
+Check a topology before launching, here for 4 cameras:
+
+    python topology.py --cameras 4
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topology.json')
+
+
+class Topology:
+    def __init__(self, data: Dict[str, Any], camera: int = 0):
+        self.host = data.get('host', 'localhost')
+        self.stride = data.get('camera_port_stride', 0)
+        self.camera = camera
+        self.endpoints: Dict[str, Dict[str, Any]] = data['endpoints']
+
+    def port(self, name: str, camera: int = None) -> int:
+        camera = self.camera if camera is None else camera
+        return self.endpoints[name]['port'] + camera * self.stride
+
+    def ports(self) -> Dict[str, int]:
+        return {name: self.port(name) for name in self.endpoints}
+
+    def topics(self) -> Dict[str, str]:
+        return {name: endpoint.get('topic') for name, endpoint in self.endpoints.items()}
+
+    def connect_address(self, name: str) -> str:
+        host = self.endpoints[name].get('host', self.host)
+        return f"tcp://{host}:{self.port(name)}"
+
+    def bind_address(self, name: str) -> str:
+        host = self.endpoints[name].get('host', '*')
+        return f"tcp://{host}:{self.port(name)}"
+
+    def configure_socket(self, socket, name: str):
+        """Apply the endpoint's hwm and conflate options; call before bind/connect"""
+        import zmq  # only the stages need zmq, not the validator
+        endpoint = self.endpoints[name]
+        if 'hwm' in endpoint:
+            socket.setsockopt(zmq.SNDHWM, endpoint['hwm'])
+            socket.setsockopt(zmq.RCVHWM, endpoint['hwm'])
+        if endpoint.get('conflate'):
+            socket.setsockopt(zmq.CONFLATE, 1)
+
+
+def validate(data: Dict[str, Any], cameras: int = 1) -> List[str]:
+    """Problems that would stop the pipeline from running `cameras` copies side by side"""
+    problems = []
+    endpoints = data.get('endpoints')
+    if not isinstance(endpoints, dict) or not endpoints:
+        return ["topology has no endpoints"]
+
+    for name, endpoint in endpoints.items():
+        port = endpoint.get('port')
+        if not isinstance(port, int) or not 1024 <= port <= 65535:
+            problems.append(f"{name}: port {port!r} is not a TCP port in 1024-65535")
+        if not endpoint.get('bind'):
+            problems.append(f"{name}: no stage binds it")
+        if endpoint.get('conflate') and endpoint.get('topic'):
+            problems.append(f"{name}: conflate drops multipart messages, but it has topic "
+                            f"{endpoint['topic']!r}")
+    if problems:
+        return problems
+
+    topology = Topology(data)
+    if cameras > 1 and topology.stride <= 0:
+        return [f"camera_port_stride must be positive to run {cameras} cameras"]
+
+    # ZMQ binds are per port, so two endpoints on one port collide whatever their host
+    bound = {}
+    for camera in range(cameras):
+        for name in endpoints:
+            port = topology.port(name, camera)
+            if port > 65535:
+                problems.append(f"camera {camera} {name}: port {port} is out of range")
+            elif port in bound:
+                other_camera, other_name = bound[port]
+                problems.append(f"port {port} is bound by camera {other_camera} {other_name} "
+                                f"and camera {camera} {name}")
+            else:
+                bound[port] = (camera, name)
+    return problems
+
+
+def load_topology(path: str = None, camera: int = None) -> Topology:
+    """Topology from path (FALL_TOPOLOGY, or topology.json) for camera (FALL_CAMERA, or 0)"""
+    path = path or os.environ.get('FALL_TOPOLOGY', DEFAULT_PATH)
+    camera = int(os.environ.get('FALL_CAMERA', 0)) if camera is None else camera
+    with open(path, 'r') as f:
+        data = json.load(f)
+    problems = validate(data, cameras=camera + 1)
+    if problems:
+        raise ValueError(f"Invalid topology {path}: " + "; ".join(problems))
+    return Topology(data, camera)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the pipeline topology for port collisions")
+    parser.add_argument("--topology", default=os.environ.get('FALL_TOPOLOGY', DEFAULT_PATH))
+    parser.add_argument("--cameras", type=int, default=1, help="number of pipelines on this host")
+    args = parser.parse_args()
+
+    with open(args.topology, 'r') as f:
+        data = json.load(f)
+    problems = validate(data, args.cameras)
+    for problem in problems:
+        print(f"ERROR: {problem}")
+    if problems:
+        sys.exit(1)
+
+    topology = Topology(data)
+    for camera in range(args.cameras):
+        print(f"camera {camera}:")
+        for name, endpoint in topology.endpoints.items():
+            print(f"  {name:<17} {topology.port(name, camera):>5}  {endpoint.get('topic') or '-':<15} "
+                  f"bound by {endpoint['bind']}")
@@ -0,0 +1,134 @@
+"""Track IDs for several people in view.
+
+IoUTracker gives every person's pose a Track_ID by matching the landmark
+bounding boxes of consecutive frames. TrackTable is the bounded dict used
+for anything kept per track (tracker boxes, FeatureCalculator state): it
+never holds more than `max_tracks` entries and drops tracks that have not
+been seen for `max_idle` seconds, so people walking through the camera view
+cannot grow memory without bound.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+def landmark_bbox(landmarks):
+    """(x_min, y_min, x_max, y_max) of a flat [x0, y0, x1, y1, ...] landmark list"""
+    points = np.asarray(landmarks, dtype=float).reshape(-1, 2)
+    return np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Intersection over union of every box in boxes_a (N, 4) with every box in boxes_b (M, 4)"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(1, -1, 4)
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class TrackTable:
+    """Per-track state, created on first use by `factory()`.
+
+    Tracks are kept in least-recently-seen order. When a new track would
+    exceed `max_tracks` the oldest one is evicted; evict_idle() drops tracks
+    idle for more than `max_idle` seconds. `on_evict(track_id, state)` is
+    called for every dropped track.
+    """
+
+    def __init__(self, factory, max_tracks=16, max_idle=5.0, on_evict=None):
+        self.factory = factory
+        self.max_tracks = max_tracks
+        self.max_idle_ns = int(max_idle * 1e9)
+        self.on_evict = on_evict
+        self.tracks = OrderedDict()  # track_id -> [last_seen_ns, state]
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __contains__(self, track_id):
+        return track_id in self.tracks
+
+    def get(self, track_id, monotonic_ns):
+        """State of a track, marking it as seen at monotonic_ns"""
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            while len(self.tracks) >= self.max_tracks:
+                self.evict(next(iter(self.tracks)))
+            entry = self.tracks[track_id] = [monotonic_ns, self.factory()]
+        else:
+            entry[0] = monotonic_ns
+            self.tracks.move_to_end(track_id)
+        return entry[1]
+
+    def peek(self, track_id):
+        """State of a track without marking it as seen, or None"""
+        entry = self.tracks.get(track_id)
+        return None if entry is None else entry[1]
+
+    def items(self):
+        """(track_id, state) pairs, least recently seen first"""
+        return [(track_id, entry[1]) for track_id, entry in self.tracks.items()]
+
+    def evict(self, track_id):
+        _, state = self.tracks.pop(track_id)
+        if self.on_evict is not None:
+            self.on_evict(track_id, state)
+
+    def evict_idle(self, monotonic_ns):
+        while self.tracks:
+            track_id, (last_seen_ns, _) = next(iter(self.tracks.items()))
+            if monotonic_ns - last_seen_ns <= self.max_idle_ns:
+                break
+            self.evict(track_id)
+
+    def clear(self):
+        for track_id in list(self.tracks):
+            self.evict(track_id)
+
+
+class IoUTracker:
+    """Greedy IoU matching of boxes against the tracks' boxes from earlier frames"""
+
+    def __init__(self, iou_threshold=0.3, max_idle=1.0, max_tracks=16):
+        self.iou_threshold = iou_threshold
+        self.tracks = TrackTable(lambda: {"box": None}, max_tracks=max_tracks, max_idle=max_idle)
+        self.next_id = 1
+
+    def update(self, boxes, monotonic_ns):
+        """Track IDs for the boxes (N, 4) of one frame, in the same order"""
+        self.tracks.evict_idle(monotonic_ns)
+        track_ids = [None] * len(boxes)
+        existing = self.tracks.items()
+
+        if existing and len(boxes):
+            iou = iou_matrix(boxes, [state["box"] for _, state in existing])
+            # Best pairs first; each box and each track is used at most once
+            for flat in np.argsort(-iou, axis=None):
+                box_index, track_index = np.unravel_index(flat, iou.shape)
+                if iou[box_index, track_index] < self.iou_threshold:
+                    break
+                track_id = existing[track_index][0]
+                if track_ids[box_index] is None and track_id not in track_ids:
+                    track_ids[box_index] = track_id
+
+        for i, box in enumerate(boxes):
+            if track_ids[i] is None:
+                track_ids[i] = self.next_id
+                self.next_id += 1
+            self.tracks.get(track_ids[i], monotonic_ns)["box"] = np.asarray(box, dtype=float)
+        return track_ids
+
+    def assign(self, pose_infos):
+        """Set Track_ID on the PoseData dicts of one frame from their landmark boxes"""
+        if not pose_infos:
+            return pose_infos
+        boxes = [landmark_bbox(info["Landmarks"]) for info in pose_infos]
+        track_ids = self.update(boxes, pose_infos[0]["Image_Monotonic_ns"])
+        for info, track_id in zip(pose_infos, track_ids):
+            info["Track_ID"] = track_id
+        return pose_infos
@@ -1,13 +1,10 @@
 import cv2
-import zmq
-import base64
-import json
 import numpy as np
-from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk
 from typing import List, Dict, Any  # เพิ่ม type hints
+from zone_service import ZoneDetector
 
 class ZoneDetectorApp:
     def __init__(self, root):
@@ -18,11 +15,10 @@ class ZoneDetectorApp:
         # กำหนดค่าเริ่มต้น
         self.current_frame = None
         self.after_id = None
-        self.zones_data = self.load_zones_data()
         self.show_video = tk.BooleanVar(value=True)
         
-        # เริ่มต้น ZMQ
-        self.init_zmq()
+        # โหลดโซนและเริ่มต้น ZMQ
+        self.detector = self.create_detector()
         
         # สร้าง UI
         self.init_ui()
@@ -30,38 +26,15 @@ class ZoneDetectorApp:
         # เริ่มการประมวลผล
         self.process_frames()
     
-    def load_zones_data(self) -> Dict[str, Any]:
-        """โหลดข้อมูลโซนจากไฟล์"""
+    def create_detector(self) -> ZoneDetector:
+        """โหลดข้อมูลโซนจากไฟล์และเปิด sockets"""
         try:
-            with open('zones.json', 'r') as f:
-                return json.load(f)
+            return ZoneDetector('zones.json')
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load zones.json: {str(e)}")
             self.root.destroy()
             raise
     
-    def init_zmq(self):
-        """ตั้งค่า ZMQ Sockets"""
-        self.context = zmq.Context()
-        
-        # Socket สำหรับรับภาพ
-        self.frame_socket = self.context.socket(zmq.SUB)
-        self.frame_socket.connect("tcp://localhost:5555")
-        self.frame_socket.setsockopt_string(zmq.SUBSCRIBE, "Sender_frame")
-        
-        # Socket สำหรับรับข้อมูลท่าทาง
-        self.pose_socket = self.context.socket(zmq.SUB)
-        self.pose_socket.connect("tcp://localhost:5556")
-        self.pose_socket.setsockopt_string(zmq.SUBSCRIBE, "PoseData")
-        
-        # Socket สำหรับส่งข้อมูลโซน
-        self.zone_socket = self.context.socket(zmq.PUB)
-        self.zone_socket.bind("tcp://*:5557")
-        
-        # Socket สำหรับส่งภาพที่มีการวาดโซน
-        self.annotated_img_socket = self.context.socket(zmq.PUB)
-        self.annotated_img_socket.bind("tcp://*:5561")  # เปลี่ยนพอร์ตเป็น 5561
-    
     def init_ui(self):
         """สร้างส่วนติดต่อผู้ใช้"""
         main_frame = ttk.Frame(self.root)
@@ -121,91 +94,18 @@ class ZoneDetectorApp:
         
         self.zone_status_text.config(state=tk.DISABLED)
     
-    def draw_zones(self, frame: np.ndarray, zones: List[Dict[str, Any]]) -> np.ndarray:
-        """วาดโซนบนภาพ"""
-        annotated_frame = frame.copy()
-        for zone in zones:
-            points = np.array([[point['x'], point['y']] for point in zone['points']], np.int32)
-            points = points.reshape((-1, 1, 2))
-            color = (0, 255, 0) if not zone.get('occupied', False) else (0, 0, 255)
-            cv2.polylines(annotated_frame, [points], isClosed=True, color=color, thickness=2)
-            cv2.putText(
-                annotated_frame, 
-                zone['name'], 
-                (points[0][0][0], points[0][0][1] - 10), 
-                cv2.FONT_HERSHEY_SIMPLEX, 
-                0.5, 
-                color, 
-                2
-            )
-        return annotated_frame
-    
-    def is_point_in_zone(self, x: int, y: int, zone: Dict[str, Any]) -> bool:
-        """ตรวจสอบว่าจุดอยู่ในโซนหรือไม่"""
-        points = np.array([[point['x'], point['y']] for point in zone['points']])
-        return cv2.pointPolygonTest(points, (x, y), False) >= 0
-    
-    def calculate_center(self, landmarks: List[float], width: int, height: int) -> tuple:
-        """คำนวณจุดศูนย์กลางจาก landmarks"""
-        x_coords = landmarks[::2]
-        y_coords = landmarks[1::2]
-        return int(np.mean(x_coords) * width), int(np.mean(y_coords) * height)
-    
-    def send_annotated_image(self, frame: np.ndarray):
-        """ส่งภาพที่มีการวาดโซน"""
-        try:
-            _, buffer = cv2.imencode('.jpg', frame)
-            jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-            
-            msg = {
-                "frame": jpg_as_text,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            self.annotated_img_socket.send_string("AnnotatedFrame", zmq.SNDMORE)
-            self.annotated_img_socket.send_string(json.dumps(msg))
-        except Exception as e:
-            print(f"Error sending annotated image: {e}")
-    
     def process_frames(self):
         """ประมวลผลภาพหลัก"""
         try:
-            # ค่าเริ่มต้น
-            zone_status = [{"name": zone['name'], "occupied": False} 
-                         for zone in self.zones_data['zones']]
-            occupied_zones = []
-            width, height = 0, 0
-            
-            # รับภาพ
-            frame = self.receive_frame()
-            
-            # รับข้อมูลท่าทาง
-            landmarks, width, height = self.receive_pose_data()
-            
-            if frame is not None and landmarks is not None:
-                center_x, center_y = self.calculate_center(landmarks, width, height)
-                
-                # ตรวจสอบโซน
-                zone_status, occupied_zones = self.check_zones(
-                    center_x, center_y, 
-                    zone_status, 
-                    frame, 
-                    width, 
-                    height
-                )
-                
-                # วาดโซนบนภาพ
-                annotated_frame = self.draw_zones(frame, zone_status)
-                
-                # ส่งภาพหากมีคนอยู่ในโซน
-                if occupied_zones:
-                    self.send_annotated_image(annotated_frame)
-            
-            # ส่งข้อมูลโซน
-            self.send_zone_data(zone_status, occupied_zones, width, height)
+            # เมื่อซ่อนวิดีโอจะทำงานแบบ zones-only ไม่ decode ภาพเลย
+            show_video = self.show_video.get()
+            zone_status, frame = self.detector.process(draw_person=show_video, with_frame=show_video)
             
             # อัพเดท UI
             self.update_ui(zone_status, frame)
+            frame_join = self.detector.frame_join
+            if frame_join is not None and show_video:
+                self.status_label.config(text=f"Status: Running (join miss {frame_join.miss_rate():.1%})")
             
             # จัดการเฟรมถัดไป
             self.after_id = self.root.after(30, self.process_frames)
@@ -213,66 +113,6 @@ class ZoneDetectorApp:
         except Exception as e:
             self.handle_error(e)
     
-    def receive_frame(self) -> np.ndarray:
-        """รับภาพจาก ZMQ"""
-        try:
-            frame_topic = self.frame_socket.recv_string(flags=zmq.NOBLOCK)
-            frame_data_json = self.frame_socket.recv_string(flags=zmq.NOBLOCK)
-            frame_data = json.loads(frame_data_json)
-            jpg_as_text = frame_data["frame"]
-            jpg_original = base64.b64decode(jpg_as_text)
-            return cv2.imdecode(np.frombuffer(jpg_original, dtype=np.uint8), cv2.IMREAD_COLOR)
-        except zmq.Again:
-            return None
-    
-    def receive_pose_data(self) -> tuple:
-        """รับข้อมูลท่าทางจาก ZMQ"""
-        try:
-            pose_topic = self.pose_socket.recv_string(flags=zmq.NOBLOCK)
-            pose_data_json = self.pose_socket.recv_string(flags=zmq.NOBLOCK)
-            pose_data = json.loads(pose_data_json)
-            return (
-                pose_data["Landmarks"],
-                pose_data["MAX_Width"],
-                pose_data["MAX_Height"]
-            )
-        except zmq.Again:
-            return None, 0, 0
-    
-    def check_zones(self, x: int, y: int, zones: List[Dict[str, Any]], 
-                   frame: np.ndarray, width: int, height: int) -> tuple:
-        """ตรวจสอบการครอบครองโซน"""
-        occupied_zones = []
-        for zone in zones:
-            if self.is_point_in_zone(x, y, zone):
-                zone['occupied'] = True
-                occupied_zones.append(zone['name'])
-                if self.show_video.get():
-                    cv2.circle(frame, (x, y), 5, (0, 0, 255), -1)
-                    cv2.putText(
-                        frame, 
-                        f"Person in {zone['name']}", 
-                        (x, y - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 
-                        0.5, 
-                        (0, 0, 255), 
-                        2
-                    )
-            else:
-                zone['occupied'] = False
-        return zones, occupied_zones
-    
-    def send_zone_data(self, zones: List[Dict[str, Any]], occupied: List[str], 
-                      width: int, height: int):
-        """ส่งข้อมูลโซน"""
-        self.zone_socket.send_string("ZoneData", zmq.SNDMORE)
-        self.zone_socket.send_string(json.dumps({
-            "timestamp": datetime.now().isoformat(),
-            "zones": zones,
-            "occupied_zones": occupied,
-            "image_size": {"width": width, "height": height}
-        }))
-    
     def update_ui(self, zones: List[Dict[str, Any]], frame: np.ndarray):
         """อัพเดทส่วนติดต่อผู้ใช้"""
         self.update_zone_status(zones)
@@ -296,11 +136,7 @@ class ZoneDetectorApp:
         if self.after_id:
             self.root.after_cancel(self.after_id)
         
-        self.frame_socket.close()
-        self.pose_socket.close()
-        self.zone_socket.close()
-        self.annotated_img_socket.close()
-        self.context.term()
+        self.detector.close()
         
         self.root.destroy()
 
@@ -0,0 +1,84 @@
+"""Join fall predictions with the zone each person is in.
+
+zone_service.py publishes ZoneData with the zones of every Track_ID in a
+frame and that frame's Image_Monotonic_ns. ZoneFusion keeps the last
+`history` of these per track (tracks are bounded by a TrackTable) and
+zone_for() returns the zones recorded for the frame closest in time to a
+FeatureData message. Every lookup scans at most `history` entries, so the
+join costs the same at any frame rate.
+
+Zones can make the fall state machine more or less sensitive through an
+optional "fall_state" entry in zones.json, e.g. for a bathroom:
+
+    {"name": "Bathroom", "points": [...], "fall_state": {"fallen_run": 2, "debounce": 0.5}}
+
+The keys are those of FallStateMachine.configure(); zone_sensitivity()
+rejects anything else when the zone file is loaded.
+"""
+import inspect
+from collections import deque
+from typing import Any, Dict, List
+
+from fall_state import FallStateMachine
+from tracker import TrackTable
+
+# window and fallen_run count predictions, the others are seconds
+COUNT_OPTIONS = ('window', 'fallen_run')
+STATE_OPTIONS = tuple(inspect.signature(FallStateMachine.configure).parameters)[1:]
+
+
+class ZoneFusion:
+    def __init__(self, history: int = 8, max_age: float = 1.0, max_tracks: int = 16, max_idle: float = 5.0):
+        self.max_age_ns = int(max_age * 1e9)
+        # track_id -> deque of (image_monotonic_ns, zone names), oldest first
+        self.tracks = TrackTable(lambda: deque(maxlen=history), max_tracks=max_tracks, max_idle=max_idle)
+
+    def add(self, zone_data: Dict[str, Any]):
+        """บันทึกโซนของแต่ละคนจากข้อความ ZoneData"""
+        monotonic_ns = zone_data.get("Image_Monotonic_ns") or zone_data.get("monotonic_ns")
+        if monotonic_ns is None:
+            return
+        people = zone_data.get("people")
+        if people is None:
+            # ZoneData รุ่นเก่า: ไม่มีโซนรายคน ใช้โซนที่มีคนอยู่ทั้งหมดเป็นของ track 0
+            people = [{"Track_ID": 0, "zones": zone_data.get("occupied_zones", [])}]
+        self.tracks.evict_idle(monotonic_ns)
+        for person in people:
+            self.tracks.get(person["Track_ID"], monotonic_ns).append((monotonic_ns, person["zones"]))
+
+    def zone_for(self, track_id: int, monotonic_ns: int) -> List[str]:
+        """โซนของ track ในภาพที่ใกล้ monotonic_ns ที่สุด ([] ถ้าไม่มีข้อมูลที่ใหม่พอ)"""
+        entries = self.tracks.peek(track_id)
+        if not entries:
+            return []
+        entry_ns, zones = min(entries, key=lambda entry: abs(entry[0] - monotonic_ns))
+        if abs(entry_ns - monotonic_ns) > self.max_age_ns:
+            return []
+        return zones
+
+
+def zone_sensitivity(zones: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """FallStateMachine options per zone name, from the optional "fall_state" entries.
+
+    Raises ValueError for an entry with unknown keys or invalid values.
+    """
+    sensitivity = {}
+    for zone in zones:
+        options = zone.get('fall_state')
+        if not options:
+            continue
+        if not isinstance(options, dict):
+            raise ValueError(f"Zone {zone['name']!r}: fall_state must be an object")
+        unknown = set(options) - set(STATE_OPTIONS)
+        if unknown:
+            raise ValueError(f"Zone {zone['name']!r}: unknown fall_state keys {sorted(unknown)}, "
+                             f"expected {list(STATE_OPTIONS)}")
+        for key, value in options.items():
+            if key in COUNT_OPTIONS:
+                valid = isinstance(value, int) and not isinstance(value, bool) and value >= 1
+            else:
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+            if not valid:
+                raise ValueError(f"Zone {zone['name']!r}: invalid fall_state {key} {value!r}")
+        sensitivity[zone['name']] = dict(options)
+    return sensitivity
@@ -0,0 +1,97 @@
+"""Zone polygons compiled into a per-pixel lookup raster.
+
+Zones are rasterized once per frame resolution with cv2.fillPoly, so finding
+the zones that contain a point is a single array index instead of one
+cv2.pointPolygonTest per zone per frame.
+
+- Non-overlapping zones use a label raster: 0 is "no zone", i + 1 is zone i
+  (uint8 up to 255 zones, uint16 above that).
+- Overlapping zones use a bitmask raster of shape (height, width, ceil(n / 8)):
+  bit i (little-endian within the bytes) is set when the pixel is in zone i.
+
+Each zone is filled only inside its bounding box, so compiling costs the
+zones' area rather than (number of zones x frame size).
+"""
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+
+def zone_polygon(zone: Dict[str, Any]) -> np.ndarray:
+    """Points of a zones.json entry as an int32 (N, 2) array"""
+    return np.array([[point['x'], point['y']] for point in zone['points']], np.int32)
+
+
+def zone_bbox(polygon: np.ndarray) -> np.ndarray:
+    """(x_min, y_min, x_max, y_max) of a polygon"""
+    return np.concatenate([polygon.min(axis=0), polygon.max(axis=0)])
+
+
+class ZoneRaster:
+    def __init__(self, zones: List[Dict[str, Any]], width: int, height: int):
+        self.width = width
+        self.height = height
+        self.num_zones = len(zones)
+        self.overlapping = False
+
+        label_dtype = np.uint8 if self.num_zones < 256 else np.uint16
+        labels = np.zeros((height, width), label_dtype)
+        coverage = np.zeros((height, width), np.uint8)
+
+        # Fill every zone into a mask the size of its bounding box (clipped to the frame)
+        masks = []
+        for i, zone in enumerate(zones):
+            polygon = zone_polygon(zone)
+            x_min, y_min, x_max, y_max = zone_bbox(polygon)
+            x_min, y_min = max(x_min, 0), max(y_min, 0)
+            x_max, y_max = min(x_max, width - 1), min(y_max, height - 1)
+            if x_min > x_max or y_min > y_max:
+                continue  # zone lies outside the frame
+            region = (slice(y_min, y_max + 1), slice(x_min, x_max + 1))
+            mask = np.zeros((y_max - y_min + 1, x_max - x_min + 1), np.uint8)
+            cv2.fillPoly(mask, [polygon - np.array([x_min, y_min], np.int32)], 1)
+            masks.append((i, region, mask))
+
+            if not self.overlapping and (coverage[region] & mask).any():
+                self.overlapping = True
+            coverage[region] |= mask
+            labels[region][mask.astype(bool)] = i + 1
+
+        if not self.overlapping:
+            self.raster = labels
+            return
+
+        # A pixel can be in several zones: keep one bit per zone
+        bits = np.zeros((height, width, (self.num_zones + 7) // 8), np.uint8)
+        for i, region, mask in masks:
+            bits[region + (i // 8,)] |= mask << (i % 8)
+        self.raster = bits
+
+    def matches(self, width: int, height: int) -> bool:
+        """True when the raster was built for this frame resolution"""
+        return self.width == width and self.height == height
+
+    def lookup(self, x: int, y: int) -> List[int]:
+        """Indices of the zones containing pixel (x, y); points outside the frame are in none"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return []
+        value = self.raster[y, x]
+        if not self.overlapping:
+            return [int(value) - 1] if value else []
+        return np.flatnonzero(np.unpackbits(value, bitorder='little')[:self.num_zones]).tolist()
+
+    def lookup_many(self, points: np.ndarray) -> List[List[int]]:
+        """lookup() for an (N, 2) array of (x, y) pixels in one vectorized index"""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        xs, ys = points[:, 0], points[:, 1]
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        values = self.raster[np.where(inside, ys, 0), np.where(inside, xs, 0)]
+
+        if not self.overlapping:
+            values = np.where(inside, values, 0)
+            return [[int(value) - 1] if value else [] for value in values]
+
+        member = np.unpackbits(values, axis=1, bitorder='little')[:, :self.num_zones]
+        member[~inside] = 0
+        return [np.flatnonzero(row).tolist() for row in member]
@@ -0,0 +1,96 @@
+"""Zone definitions that can be edited while the pipeline is running.
+
+ZoneRegistry watches zones.json by modification time. When the file changes
+it is loaded and compiled (polygons, bounding boxes and, for the last frame
+size seen, the lookup raster) on a background thread. Then `current` is
+replaced by the new CompiledZones in a single assignment. Callers take
+`registry.current` once per frame and use that snapshot for the whole
+frame, so a reload never mixes old and new zones.
+
+A file that fails to load (for example half-written by an editor) is
+reported and the previous zones stay in use.
+"""
+import json
+import os
+from threading import Thread, Event
+from typing import Any, Dict, List
+
+from zone_raster import ZoneRaster, zone_polygon
+
+
+def load_zones_data(path: str = 'zones.json') -> Dict[str, Any]:
+    """โหลดข้อมูลโซนจากไฟล์"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class CompiledZones:
+    """One immutable version of the zone configuration"""
+
+    def __init__(self, zones_data: Dict[str, Any], version: int = 0):
+        self.version = version
+        self.zones: List[Dict[str, Any]] = zones_data['zones']
+        self.names = [zone['name'] for zone in self.zones]
+        self.polygons = [zone_polygon(zone) for zone in self.zones]
+        self.raster = None
+
+    def raster_for(self, width: int, height: int) -> ZoneRaster:
+        """Lookup raster at the given frame size, built on first use of that size"""
+        raster = self.raster
+        if raster is None or not raster.matches(width, height):
+            raster = ZoneRaster(self.zones, width, height)
+            self.raster = raster
+        return raster
+
+
+class ZoneRegistry:
+    def __init__(self, path: str = 'zones.json', poll_interval: float = 1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.file_state = self.stat()
+        self.current = CompiledZones(load_zones_data(path))
+        self.stop_event = Event()
+        self.thread = None
+
+    def stat(self):
+        """(mtime, size) of the zone file, or None if it is missing"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            file_state = self.stat()
+            if file_state is None or file_state == self.file_state:
+                continue
+            self.file_state = file_state
+            self.reload()
+
+    def reload(self) -> bool:
+        """Compile the zone file and swap it in. Returns False if it could not be loaded"""
+        previous = self.current
+        try:
+            compiled = CompiledZones(load_zones_data(self.path), previous.version + 1)
+            # Build the raster now so the next frame does not pay for it
+            if previous.raster is not None:
+                compiled.raster_for(previous.raster.width, previous.raster.height)
+        except Exception as e:
+            print(f"Error reloading {self.path}, keeping previous zones: {e}")
+            return False
+
+        self.current = compiled
+        print(f"Reloaded {len(compiled.zones)} zones from {self.path}")
+        return True
@@ -0,0 +1,368 @@
+"""Zone occupancy detection without Tk.
+
+ZoneDetector holds the sockets and zone logic and is shared with the GUI in
+zone_detection.py. Run this file directly for the headless service:
+
+    python zone_service.py --zones zones.json
+    python zone_service.py --zones zones.json --annotate-hz 2
+
+Occupancy only needs the landmarks, so by default the service consumes
+PoseData alone and never receives or decodes video. --annotate-hz turns on
+the AnnotatedFrame stage at that rate. Frames are buffered undecoded in a
+FrameJoinBuffer and each PoseData is drawn on the frame it was computed
+from, matched by the frame's monotonic capture time.
+
+Edits to the zone file are picked up while running (see zone_registry.py).
+"""
+import argparse
+import base64
+import json
+from collections import deque
+from typing import List, Dict, Any
+
+import cv2
+import numpy as np
+import zmq
+
+from config import FRAME_RING, TOPICS, TOPOLOGY
+from frame_codec import recv_frame, decode_frame, attach_ring
+from timestamps import elapsed_seconds, now_ns
+from zone_registry import CompiledZones, ZoneRegistry
+
+
+class FrameJoinBuffer:
+    """Recent frame messages waiting for the PoseData computed from them.
+
+    Frames are kept undecoded, at most `max_frames` of them and none older
+    than `max_age` seconds behind the newest. A pose is joined with the frame
+    whose monotonic capture time is within `tolerance` seconds of its
+    Image_Monotonic_ns; a pose without such a frame counts as a join miss.
+    """
+
+    def __init__(self, max_frames: int = 30, max_age: float = 1.0, tolerance: float = 0.001):
+        self.frames = deque(maxlen=max_frames)  # (monotonic_ns, header, payload), oldest first
+        self.max_age_ns = int(max_age * 1e9)
+        self.tolerance_ns = int(tolerance * 1e9)
+        self.joined = 0
+        self.missed = 0
+
+    def add(self, header, payload):
+        self.frames.append((header.monotonic_ns, header, payload))
+        while self.frames and header.monotonic_ns - self.frames[0][0] > self.max_age_ns:
+            self.frames.popleft()
+
+    def match(self, monotonic_ns: int) -> tuple:
+        """(header, payload) of the frame for this capture time, or None on a miss"""
+        best = None
+        for i, (frame_ns, _, _) in enumerate(self.frames):
+            distance = abs(frame_ns - monotonic_ns)
+            if distance <= self.tolerance_ns and (best is None or distance < best[0]):
+                best = (distance, i)
+        if best is None:
+            self.missed += 1
+            return None
+
+        _, header, payload = self.frames[best[1]]
+        # Poses arrive in frame order, so the matched frame and everything
+        # before it will not be asked for again
+        for _ in range(best[1] + 1):
+            self.frames.popleft()
+        self.joined += 1
+        return header, payload
+
+    def newest(self) -> tuple:
+        """(header, payload) of the most recent frame, or None"""
+        if not self.frames:
+            return None
+        return self.frames[-1][1:]
+
+    def miss_rate(self) -> float:
+        total = self.joined + self.missed
+        return self.missed / total if total else 0.0
+
+    def reset_stats(self):
+        self.joined = 0
+        self.missed = 0
+
+
+class ZoneDetector:
+    def __init__(self, zones_file: str = 'zones.json', use_frames: bool = True):
+        self.use_frames = use_frames  # False = ใช้แค่ PoseData ไม่รับภาพเลย
+        self.frame_join = FrameJoinBuffer() if use_frames else None
+        # โหลดโซนและเฝ้าดูไฟล์ เมื่อไฟล์เปลี่ยนจะโหลดใหม่โดยไม่ต้องรีสตาร์ท
+        self.zone_registry = ZoneRegistry(zones_file)
+        self.zone_registry.start()
+        self.frame_ring = None
+        self.init_zmq()
+
+    def init_zmq(self):
+        """ตั้งค่า ZMQ Sockets"""
+        self.context = zmq.Context()
+
+        # Socket สำหรับรับภาพ (เฉพาะเมื่อต้องวาดภาพ) ภาพจะไปรอใน FrameJoinBuffer
+        self.frame_socket = None
+        if self.use_frames:
+            self.frame_socket = self.context.socket(zmq.SUB)
+            TOPOLOGY.configure_socket(self.frame_socket, 'frames')
+            # ไม่ต้องเก็บภาพในคิวมากกว่าที่ FrameJoinBuffer เก็บได้
+            self.frame_socket.setsockopt(zmq.RCVHWM, self.frame_join.frames.maxlen)
+            self.frame_socket.connect(TOPOLOGY.connect_address('frames'))
+            self.frame_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['frames'])
+
+        # Socket สำหรับรับข้อมูลท่าทาง
+        self.pose_socket = self.context.socket(zmq.SUB)
+        TOPOLOGY.configure_socket(self.pose_socket, 'pose_data')
+        self.pose_socket.connect(TOPOLOGY.connect_address('pose_data'))
+        self.pose_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICS['pose_data'])
+
+        # Socket สำหรับส่งข้อมูลโซน
+        self.zone_socket = self.context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.zone_socket, 'zone_data')
+        self.zone_socket.bind(TOPOLOGY.bind_address('zone_data'))
+
+        # Socket สำหรับส่งภาพที่มีการวาดโซน
+        self.annotated_img_socket = self.context.socket(zmq.PUB)
+        TOPOLOGY.configure_socket(self.annotated_img_socket, 'annotated_images')
+        self.annotated_img_socket.bind(TOPOLOGY.bind_address('annotated_images'))
+
+    def draw_zones(self, frame: np.ndarray, compiled: CompiledZones,
+                   zones: List[Dict[str, Any]], people: List[tuple] = ()) -> np.ndarray:
+        """วาดโซนบนภาพ (และตำแหน่งคนจาก people: รายการ ((x, y), index ของโซนที่คนนั้นอยู่))"""
+        annotated_frame = frame.copy()
+        for i, (zone, polygon, status) in enumerate(zip(compiled.zones, compiled.polygons, zones)):
+            points = polygon.reshape((-1, 1, 2))
+            color = (0, 255, 0) if not status.get('occupied', False) else (0, 0, 255)
+            cv2.polylines(annotated_frame, [points], isClosed=True, color=color, thickness=2)
+            cv2.putText(
+                annotated_frame,
+                zone['name'],
+                (points[0][0][0], points[0][0][1] - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                color,
+                2
+            )
+            for (x, y), person_zones in people:
+                if i not in person_zones:
+                    continue
+                cv2.circle(annotated_frame, (x, y), 5, (0, 0, 255), -1)
+                cv2.putText(
+                    annotated_frame,
+                    f"Person in {zone['name']}",
+                    (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5,
+                    (0, 0, 255),
+                    2
+                )
+        return annotated_frame
+
+    def calculate_center(self, landmarks: List[float], width: int, height: int) -> tuple:
+        """คำนวณจุดศูนย์กลางจาก landmarks"""
+        x_coords = landmarks[::2]
+        y_coords = landmarks[1::2]
+        return int(np.mean(x_coords) * width), int(np.mean(y_coords) * height)
+
+    def send_annotated_image(self, frame: np.ndarray):
+        """ส่งภาพที่มีการวาดโซน"""
+        try:
+            _, buffer = cv2.imencode('.jpg', frame)
+            jpg_as_text = base64.b64encode(buffer).decode('utf-8')
+
+            timestamp_ns, monotonic_ns = now_ns()
+            msg = {
+                "frame": jpg_as_text,
+                "timestamp_ns": timestamp_ns,
+                "monotonic_ns": monotonic_ns
+            }
+
+            self.annotated_img_socket.send_string(TOPICS['annotated_images'], zmq.SNDMORE)
+            self.annotated_img_socket.send_string(json.dumps(msg))
+        except Exception as e:
+            print(f"Error sending annotated image: {e}")
+
+    def process(self, draw_person: bool = True, with_frame: bool = True) -> tuple:
+        """รับท่าทางหนึ่งรอบ ตรวจสอบโซน แล้วส่งผล
+
+        The zones come from PoseData alone. With with_frame the frame the pose
+        was computed from is decoded, annotated and published when a zone is
+        occupied. Without a pose this round the newest frame is shown with
+        zones only. Returns (zone_status, annotated frame); the frame is None
+        when there is nothing to show.
+        """
+        # ใช้โซนชุดเดียวตลอดทั้งเฟรม แม้จะมีการโหลดไฟล์ใหม่ระหว่างนั้น
+        compiled = self.zone_registry.current
+
+        # ค่าเริ่มต้น
+        zone_status = [{"name": name, "occupied": False} for name in compiled.names]
+        occupied_zones = []
+        people = []
+        person_zone_names = []
+        image_monotonic_ns = None
+        width, height = 0, 0
+
+        # เก็บภาพที่เข้ามาไว้รอจับคู่ (ยังไม่ decode)
+        self.receive_frames()
+
+        # รับข้อมูลท่าทางของทุกคนในภาพล่าสุด
+        poses = self.receive_poses()
+
+        if poses:
+            width, height = poses[0]["MAX_Width"], poses[0]["MAX_Height"]
+            centers = [self.calculate_center(pose["Landmarks"], width, height) for pose in poses]
+
+            # ตรวจสอบโซน (ทุกคนพร้อมกัน)
+            person_zones = compiled.raster_for(width, height).lookup_many(centers)
+            zone_status, occupied_zones = self.check_zones(person_zones, zone_status, compiled)
+            people = list(zip(centers, person_zones))
+            image_monotonic_ns = poses[0].get("Image_Monotonic_ns")
+            # โซนของแต่ละคน (ตาม Track_ID) สำหรับ label.py
+            person_zone_names = [{"Track_ID": pose.get("Track_ID", 0),
+                                  "zones": [compiled.names[i] for i in indices]}
+                                 for pose, indices in zip(poses, person_zones)]
+
+        # รับภาพและวาดโซน (เฉพาะเมื่อต้องการ)
+        annotated_frame = None
+        frame = None
+        if with_frame and self.frame_join is not None:
+            if poses:
+                # ภาพต้องเป็นภาพเดียวกับที่ใช้หาท่าทาง ไม่เช่นนั้นไม่วาด
+                frame = self.decode(self.frame_join.match(poses[0].get("Image_Monotonic_ns")))
+            else:
+                frame = self.decode(self.frame_join.newest())
+        if frame is not None:
+            annotated_frame = self.draw_zones(
+                frame, compiled, zone_status, people if draw_person else ())
+
+            # ส่งภาพหากมีคนอยู่ในโซน
+            if occupied_zones:
+                self.send_annotated_image(annotated_frame)
+
+        # ส่งข้อมูลโซน
+        self.send_zone_data(zone_status, occupied_zones, width, height,
+                            person_zone_names, image_monotonic_ns)
+        return zone_status, annotated_frame
+
+    def receive_frames(self):
+        """รับภาพทั้งหมดที่รออยู่ใน ZMQ เข้า FrameJoinBuffer"""
+        if self.frame_socket is None:
+            return
+        while True:
+            try:
+                header, payload = recv_frame(self.frame_socket, flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self.frame_join.add(header, payload)
+
+    def decode(self, message: tuple) -> np.ndarray:
+        """decode ภาพจาก (header, payload) ที่ได้จาก FrameJoinBuffer"""
+        if message is None:
+            return None
+        header, payload = message
+        self.frame_ring = attach_ring(self.frame_ring, header, payload, FRAME_RING['name'])
+        return decode_frame(header, payload, self.frame_ring)
+
+    def receive_poses(self) -> List[Dict[str, Any]]:
+        """รับ PoseData ที่รออยู่ทั้งหมด คืนเฉพาะของภาพล่าสุด (หนึ่งข้อความต่อคน)"""
+        poses = []
+        while True:
+            try:
+                pose_topic = self.pose_socket.recv_string(flags=zmq.NOBLOCK)
+                pose_data = json.loads(self.pose_socket.recv_string(flags=zmq.NOBLOCK))
+            except zmq.Again:
+                return poses
+            if poses and pose_data.get("Image_Monotonic_ns") != poses[-1].get("Image_Monotonic_ns"):
+                poses = []
+            poses.append(pose_data)
+
+    def check_zones(self, person_zones: List[List[int]], zones: List[Dict[str, Any]],
+                    compiled: CompiledZones) -> tuple:
+        """ตรวจสอบการครอบครองโซน จาก index ของโซนที่แต่ละคนอยู่"""
+        occupied_zones = []
+        inside = set()
+        for point_zones in person_zones:
+            inside.update(point_zones)
+        for i, (zone, status) in enumerate(zip(compiled.zones, zones)):
+            if i in inside:
+                status['occupied'] = True
+                occupied_zones.append(zone['name'])
+            else:
+                status['occupied'] = False
+        return zones, occupied_zones
+
+    def send_zone_data(self, zones: List[Dict[str, Any]], occupied: List[str],
+                       width: int, height: int, people: List[Dict[str, Any]] = (),
+                       image_monotonic_ns: int = None):
+        """ส่งข้อมูลโซน (people: โซนของแต่ละ Track_ID ในภาพที่ถ่ายเมื่อ image_monotonic_ns)"""
+        timestamp_ns, monotonic_ns = now_ns()
+        self.zone_socket.send_string(TOPICS['zone_data'], zmq.SNDMORE)
+        self.zone_socket.send_string(json.dumps({
+            "timestamp_ns": timestamp_ns,
+            "monotonic_ns": monotonic_ns,
+            "zones": zones,
+            "occupied_zones": occupied,
+            "people": list(people),
+            "Image_Monotonic_ns": image_monotonic_ns,
+            "image_size": {"width": width, "height": height}
+        }))
+
+    def close(self):
+        self.zone_registry.stop()
+        if self.frame_socket is not None:
+            self.frame_socket.close()
+        self.pose_socket.close()
+        self.zone_socket.close()
+        self.annotated_img_socket.close()
+        self.context.term()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+
+
+class ZoneService:
+    def __init__(self, zones_file: str = 'zones.json', annotate_hz: float = 0.0):
+        # annotate_hz = 0: zones-only, the frame stream is never subscribed
+        self.annotate_interval = 1 / annotate_hz if annotate_hz > 0 else None
+        self.detector = ZoneDetector(zones_file, use_frames=self.annotate_interval is not None)
+        self.poller = zmq.Poller()
+        self.poller.register(self.detector.pose_socket, zmq.POLLIN)
+
+    def run(self):
+        mode = "zones only" if self.annotate_interval is None else "with annotated frames"
+        print(f"Zone detection running ({mode})")
+        last_annotated_ns = None
+        last_report_ns = now_ns()[1]
+        try:
+            while True:
+                # รอจนกว่าจะมีข้อมูลท่าทางใหม่ หรือครบ 30 ms เหมือนรอบของ GUI
+                pose_ready = self.poller.poll(30)
+
+                # วาดภาพเฉพาะรอบที่มีท่าทางใหม่ให้จับคู่กับภาพ
+                with_frame = False
+                if self.annotate_interval is not None and pose_ready:
+                    _, monotonic_ns = now_ns()
+                    if (last_annotated_ns is None or
+                            elapsed_seconds(last_annotated_ns, monotonic_ns) >= self.annotate_interval):
+                        with_frame = True
+                        last_annotated_ns = monotonic_ns
+                self.detector.process(with_frame=with_frame)
+
+                frame_join = self.detector.frame_join
+                if frame_join is not None and elapsed_seconds(last_report_ns, now_ns()[1]) >= 5.0:
+                    print(f"Frame join: {frame_join.joined} joined, {frame_join.missed} missed "
+                          f"({frame_join.miss_rate():.1%} miss rate)")
+                    frame_join.reset_stats()
+                    last_report_ns = now_ns()[1]
+        except KeyboardInterrupt:
+            print("Program terminated by user")
+        finally:
+            self.detector.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless zone detection")
+    parser.add_argument("--zones", default="zones.json", help="zone definition file")
+    parser.add_argument("--annotate-hz", type=float, default=0.0,
+                        help="publish AnnotatedFrame at this rate (0 = zones only, no video)")
+    args = parser.parse_args()
+
+    ZoneService(args.zones, annotate_hz=args.annotate_hz).run()